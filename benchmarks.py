@@ -0,0 +1,164 @@
+"""Micro-benchmarks for hot paths in main.py
+
+Run with: python benchmarks.py
+"""
+import datetime
+import timeit
+import tracemalloc
+
+import discord
+
+import main
+
+SAMPLE_MESSAGES = [
+    "hello there!",
+    "how are you doing today?",
+    "thanks a lot for the help",
+    "ok bye, see you tomorrow",
+    "what can you do?",
+    "can you calculate 2+2",
+    "tell me something funny",
+    "what do you think about the weather in paris this weekend",
+    "I was wondering whether you could recommend a good anime to watch tonight",
+    "",
+]
+
+def legacy_canned_intent(message):
+    """The original any()-chain classifier, kept as a baseline"""
+    message_lower = message.lower()
+    if any(word in message_lower for word in ["hello", "hi", "hey", "greetings"]):
+        return "greeting"
+    elif any(word in message_lower for word in ["how are you", "how's it going", "what's up"]):
+        return "status"
+    elif any(word in message_lower for word in ["thank", "thanks", "appreciate"]):
+        return "thanks"
+    elif any(word in message_lower for word in ["bye", "goodbye", "see you", "farewell"]):
+        return "goodbye"
+    elif any(word in message_lower for word in ["help", "what can you do", "commands"]):
+        return "help"
+    elif any(word in message_lower for word in ["math", "calculate"]):
+        return "math"
+    elif any(word in message_lower for word in ["joke", "funny"]):
+        return "joke"
+    return None
+
+def bench(label, func, number=20000):
+    """Print the best per-call time over a few repeats"""
+    per_call = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{label:<45} {per_call * 1e6:8.2f} µs")
+
+def bench_canned_responses():
+    for message in SAMPLE_MESSAGES:
+        assert main.classify_message(message) == legacy_canned_intent(message), message
+
+    def run_legacy():
+        for message in SAMPLE_MESSAGES:
+            legacy_canned_intent(message)
+
+    def run_compiled():
+        for message in SAMPLE_MESSAGES:
+            main.classify_message(message)
+
+    print(f"Mention classification ({len(SAMPLE_MESSAGES)} messages per call)")
+    bench("  legacy any() chain", run_legacy)
+    bench("  per-intent compiled matchers", run_compiled)
+
+def legacy_create_aesthetic_embed(title, description="", color=discord.Color.purple(), thumbnail_url=None):
+    """create_aesthetic_embed before template caching, kept as a baseline"""
+    styled_title = f"╭─── ✨ {title} ✨ ───╮"
+    if description:
+        styled_description = f"│ {description} │"
+    else:
+        styled_description = ""
+
+    embed = discord.Embed(
+        title=styled_title,
+        description=styled_description,
+        color=color,
+        timestamp=datetime.datetime.now()
+    )
+    embed.set_footer(
+        text="╰─── 🌟 Advanced OwO Bot • Superior Experience ───╯",
+        icon_url="https://cdn.discordapp.com/emojis/878328329692819466.gif"
+    )
+    if thumbnail_url:
+        embed.set_thumbnail(url=thumbnail_url)
+    if color == discord.Color.gold():
+        embed.add_field(name="", value="⭐ ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━ ⭐", inline=False)
+    elif color == discord.Color.green():
+        embed.add_field(name="", value="💚 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━ 💚", inline=False)
+    elif color == discord.Color.red():
+        embed.add_field(name="", value="❤️ ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━ ❤️", inline=False)
+    return embed
+
+EMBED_CALLS = [
+    ("💰 Daily Reward", "║ You claimed **500** 💵! ║", discord.Color.gold(), None),
+    ("❌ Insufficient Funds", "║ You don't have enough money! ║", discord.Color.red(), None),
+    ("💕 Warm Hug", "**a** gives **b** a warm, loving hug! 🤗", discord.Color.from_rgb(255, 182, 193), None),
+    ("Someone's Profile", "stats", discord.Color.purple(), "https://cdn.discordapp.com/embed/avatars/0.png"),
+]
+
+def allocated_bytes(func, number=200):
+    """Average peak memory allocated by a single call"""
+    total = 0
+    tracemalloc.start()
+    for _ in range(number):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        func()
+        total += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return total / number
+
+def bench_aesthetic_embeds():
+    def without_timestamp(embed):
+        data = embed.to_dict()
+        data.pop("timestamp", None)
+        return data
+
+    for args in EMBED_CALLS:
+        assert without_timestamp(main.create_aesthetic_embed(*args)) == without_timestamp(legacy_create_aesthetic_embed(*args))
+
+    def run_legacy():
+        return [legacy_create_aesthetic_embed(*args) for args in EMBED_CALLS]
+
+    def run_templated():
+        return [main.create_aesthetic_embed(*args) for args in EMBED_CALLS]
+
+    print(f"Aesthetic embeds ({len(EMBED_CALLS)} embeds per call)")
+    bench("  legacy create_aesthetic_embed", run_legacy)
+    bench("  templated create_aesthetic_embed", run_templated)
+    print(f"  {'allocated per call (legacy / templated)':<43} "
+          f"{allocated_bytes(run_legacy):,.0f} B / {allocated_bytes(run_templated):,.0f} B")
+
+def legacy_level_for_xp(xp):
+    """The original add_xp level loop, kept as a baseline"""
+    level = 1
+    while main.calculate_xp_for_level(level) <= xp:
+        level += 1
+    return level - 1
+
+def legacy_total_xp_for_level(level):
+    """The original setlevel XP sum, kept as a baseline"""
+    return sum(int(100 * (i ** 1.5)) for i in range(1, level + 1))
+
+def bench_levels():
+    print("Level lookups")
+    for level in (10, 100, 500, 999):
+        xp = main.total_xp_for_level(level)
+        assert main.level_for_xp(xp) == legacy_level_for_xp(xp)
+        assert main.total_xp_for_level(level) == legacy_total_xp_for_level(level)
+        bench(f"  add_xp level at {xp:,} XP (legacy)", lambda: legacy_level_for_xp(xp), number=200)
+        bench(f"  add_xp level at {xp:,} XP (bisect)", lambda: main.level_for_xp(xp))
+        bench(f"  setlevel {level} XP (legacy sum)", lambda: legacy_total_xp_for_level(level), number=200)
+        bench(f"  setlevel {level} XP (table)", lambda: main.total_xp_for_level(level))
+
+BENCHMARKS = [
+    bench_canned_responses,
+    bench_aesthetic_embeds,
+    bench_levels,
+]
+
+if __name__ == "__main__":
+    for benchmark in BENCHMARKS:
+        benchmark()
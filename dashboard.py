@@ -9,10 +9,16 @@ from pymongo import MongoClient
 import asyncio
 import threading
 import requests
+import sys
 from functools import wraps
 
-# Import bot instance and data functions from main
-import main
+# Import bot instance and data functions from main. When the bot is started as a
+# script it lives in __main__, and a fresh `import main` would build a second,
+# idle copy of the bot and its caches
+if hasattr(sys.modules.get("__main__"), "bot"):
+    main = sys.modules["__main__"]
+else:
+    import main
 
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here')
@@ -41,18 +47,12 @@ def get_bot_stats():
         
         # Get database stats
         try:
-            if mongo_client:
-                total_registered = users.count_documents({})
-                total_balance = sum(user.get('balance', 0) for user in users.find({}))
-                total_marriages = marriages.count_documents({"accepted": True})
-                active_today = users.count_documents({
-                    "last_daily": {"$gte": datetime.datetime.now() - datetime.timedelta(days=1)}
-                })
-            else:
-                total_registered = len(main.users_data)
-                total_balance = sum(user.get('balance', 0) for user in main.users_data.values())
-                total_marriages = len([m for m in main.marriages_data.values() if m.get('accepted')])
-                active_today = 0
+            total_registered = users.count_documents({})
+            total_balance = sum(user.get('balance', 0) for user in users.find({}, {"balance": 1}))
+            total_marriages = marriages.count_documents({"accepted": True})
+            active_today = users.count_documents({
+                "last_daily": {"$gte": datetime.datetime.now() - datetime.timedelta(days=1)}
+            })
         except:
             total_registered = 0
             total_balance = 0
@@ -89,10 +89,7 @@ def get_bot_stats():
 def get_top_users(limit=10):
     """Get top users by balance"""
     try:
-        if mongo_client:
-            top_users = list(users.find().sort("balance", -1).limit(limit))
-        else:
-            top_users = sorted(main.users_data.values(), key=lambda x: x.get('balance', 0), reverse=True)[:limit]
+        top_users = main.leaderboards.snapshot_top("balance", limit)
         
         result = []
         for user_data in top_users:
@@ -166,14 +163,8 @@ def users_page():
         page = request.args.get('page', 1, type=int)
         per_page = 20
         
-        if mongo_client:
-            total_users = users.count_documents({})
-            user_list = list(users.find().skip((page - 1) * per_page).limit(per_page))
-        else:
-            user_list = list(main.users_data.values()) if hasattr(main, 'users_data') else []
-            total_users = len(user_list)
-            start = (page - 1) * per_page
-            user_list = user_list[start:start + per_page]
+        total_users = users.count_documents({})
+        user_list = list(users.find().skip((page - 1) * per_page).limit(per_page))
         
         # Enrich with Discord data
         enriched_users = []
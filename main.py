@@ -1,8 +1,8 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import random
 import asyncio
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
 import datetime
 import requests
 from io import BytesIO
@@ -10,17 +10,36 @@ from PIL import Image, ImageFont, ImageDraw
 import textwrap
 import os
 import json
+import re
+import sqlite3
+import threading
+import atexit
+import uuid
 import math
 import aiohttp
 import copy
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from contextvars import ContextVar
+from time import perf_counter, monotonic
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right, insort
+from array import array
+from openai import AsyncOpenAI
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
 
 # Groq AI Setup
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "20"))
 groq_client = None
 if os.getenv("GROQ_API_KEY"):
-    groq_client = OpenAI(
+    groq_client = AsyncOpenAI(
         api_key=os.getenv("GROQ_API_KEY"),
         base_url="https://api.groq.com/openai/v1",
+        timeout=GROQ_TIMEOUT,
+        max_retries=1,
     )
     print("Groq AI initialized!")
 
@@ -47,63 +66,743 @@ if mongo_client:
     inventories = db["inventories"]
     marriages = db["marriages"]
 else:
-    # Fallback to local storage (in-memory)
-    users_data = {}
-    inventories_data = {}
-    marriages_data = {}
+    # Fallback to a local SQLite database so a single-node deployment keeps its data
+    FALLBACK_DB_PATH = os.getenv("FALLBACK_DB_PATH", "owo_bot.db")
+    FALLBACK_BATCH_SIZE = 100      # writes per commit at most
+    FALLBACK_FLUSH_SECONDS = 1.0   # and never left uncommitted for longer than this
+
+    def _get_path(doc, path):
+        for part in path.split("."):
+            if not isinstance(doc, dict):
+                return None
+            doc = doc.get(part)
+        return doc
+
+    def _compare(value, op, operand):
+        if op == "$in":
+            return value in operand
+        if op == "$nin":
+            return value not in operand
+        if op == "$ne":
+            return value != operand
+        if op == "$exists":
+            return (value is not None) == bool(operand)
+        if value is None:
+            return False
+        try:
+            if op == "$gt":
+                return value > operand
+            if op == "$gte":
+                return value >= operand
+            if op == "$lt":
+                return value < operand
+            if op == "$lte":
+                return value <= operand
+        except TypeError:
+            return False  # Mongo never matches across types either
+        raise ValueError(f"Unsupported query operator {op}")
+
+    def _matches(doc, query):
+        for field, condition in query.items():
+            if field == "$or":
+                if not any(_matches(doc, branch) for branch in condition):
+                    return False
+            elif field == "$and":
+                if not all(_matches(doc, branch) for branch in condition):
+                    return False
+            elif isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+                value = _get_path(doc, field)
+                if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                    return False
+            elif _get_path(doc, field) != condition:
+                return False
+        return True
+
+    # Query planning: the index-friendly parts of a query become a SQL WHERE
+    # clause so SQLite can use the primary key and expression indexes. The SQL
+    # only has to narrow the candidates; _matches still checks every document.
+    SQL_FIELD = re.compile(r"^\w+$")
+    SQL_COMPARISONS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+    NOT_SQL = object()
+
+    def _sql_value(value):
+        if isinstance(value, bool):
+            return int(value)  # json_extract reports JSON booleans as 0/1
+        if value is None or isinstance(value, (int, float, str)):
+            return value
+        return NOT_SQL
+
+    def _sql_where(query, params):
+        clauses = []
+        for field, condition in query.items():
+            if field in ("$or", "$and"):
+                branches = []
+                branch_params = []
+                for branch in condition:
+                    clause = _sql_where(branch, branch_params)
+                    if not clause:
+                        break
+                    branches.append(clause)
+                else:
+                    if branches:
+                        joiner = " OR " if field == "$or" else " AND "
+                        clauses.append("(" + joiner.join(branches) + ")")
+                        params.extend(branch_params)
+                continue
 
-    class FallbackCollection:
-        def __init__(self, data_dict):
-            self.data = data_dict
+            if field == "_id":
+                column, encode = "id", _dumps
+            elif SQL_FIELD.match(field):
+                column, encode = f"json_extract(doc, '$.{field}')", _sql_value
+            else:
+                continue
+
+            if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+                if "$in" in condition:
+                    values = [encode(value) for value in condition["$in"]]
+                    if not values:
+                        clauses.append("0")
+                    elif NOT_SQL not in values and None not in values:
+                        clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                        params.extend(values)
+                if field != "_id":
+                    for op, sql_op in SQL_COMPARISONS.items():
+                        value = _sql_value(condition.get(op))
+                        if op in condition and isinstance(condition[op], datetime.datetime):
+                            # Stored as {"$date": ...}, which json_extract returns as text,
+                            # so an index range over text skips users without the field
+                            clauses.append(f"{column} > ''")
+                        elif op in condition and value is not NOT_SQL and value is not None:
+                            clauses.append(f"{column} {sql_op} ?")
+                            params.append(value)
+            else:
+                value = encode(condition)
+                if value is None:
+                    clauses.append(f"{column} IS NULL")
+                elif value is not NOT_SQL:
+                    clauses.append(f"{column} = ?")
+                    params.append(value)
+        return " AND ".join(clauses)
+
+    def _apply_update(doc, update, inserted=False):
+        if inserted:
+            for path, value in update.get("$setOnInsert", {}).items():
+                doc[path] = value
+        for path, value in update.get("$set", {}).items():
+            *parents, leaf = path.split(".")
+            target = doc
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[leaf] = value
+        for path, amount in update.get("$inc", {}).items():
+            *parents, leaf = path.split(".")
+            target = doc
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[leaf] = target.get(leaf, 0) + amount
+        for path in update.get("$unset", {}):
+            *parents, leaf = path.split(".")
+            target = doc
+            for part in parents:
+                target = target.get(part)
+                if not isinstance(target, dict):
+                    break
+            else:
+                target.pop(leaf, None)
+
+    # Documents are stored as JSON; datetimes round-trip as {"$date": iso}
+    def _encode_value(value):
+        if isinstance(value, datetime.datetime):
+            return {"$date": value.isoformat()}
+        raise TypeError(f"Cannot store {type(value).__name__}")
+
+    def _decode_object(obj):
+        if len(obj) == 1 and "$date" in obj:
+            return datetime.datetime.fromisoformat(obj["$date"])
+        return obj
+
+    def _dumps(value):
+        return json.dumps(value, default=_encode_value, ensure_ascii=False)
+
+    def _loads(text):
+        return json.loads(text, object_hook=_decode_object)
+
+    class SQLiteStore:
+        """A WAL-mode SQLite database whose writes are committed in batches"""
+
+        def __init__(self, path):
+            self.lock = threading.RLock()
+            self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            # NORMAL is crash-safe in WAL mode; a power loss can only drop the last batch
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.pending = 0
+            self.closed = threading.Event()
+            threading.Thread(target=self._flush_loop, name="owo-sqlite-flush", daemon=True).start()
+            atexit.register(self.flush)
+
+        def write(self, sql, params=()):
+            with self.lock:
+                if not self.conn.in_transaction:
+                    self.conn.execute("BEGIN")
+                self.conn.execute(sql, params)
+                self.pending += 1
+                if self.pending >= FALLBACK_BATCH_SIZE:
+                    self.flush()
+
+        def flush(self):
+            with self.lock:
+                if self.conn.in_transaction:
+                    self.conn.execute("COMMIT")
+                self.pending = 0
+
+        def _flush_loop(self):
+            while not self.closed.wait(FALLBACK_FLUSH_SECONDS):
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Failed to flush fallback database: {e}")
+
+    class SQLiteCollection:
+        """Mongo-style collection of JSON documents in one SQLite table"""
+
+        def __init__(self, store, name, indexes=()):
+            self.store = store
+            self.name = name
+            with store.lock:
+                store.conn.execute(f"CREATE TABLE IF NOT EXISTS {name} (id TEXT PRIMARY KEY, doc TEXT NOT NULL)")
+                # Each index is a tuple of top-level fields
+                for fields in indexes:
+                    columns = ", ".join(f"json_extract(doc, '$.{field}')" for field in fields)
+                    store.conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_{'_'.join(fields)} ON {name} ({columns})")
+
+        def _put(self, doc):
+            self.store.write(f"INSERT OR REPLACE INTO {self.name} (id, doc) VALUES (?, ?)",
+                             (_dumps(doc["_id"]), _dumps(doc)))
+
+        def _scan(self, query, sort=None, limit=0):
+            sql = f"SELECT doc FROM {self.name}"
+            params = []
+            where = _sql_where(query, params)
+            if where:
+                sql += f" WHERE {where}"
+            if sort:
+                field, direction = sort
+                sql += f" ORDER BY json_extract(doc, '$.{field}') {'DESC' if direction == -1 else 'ASC'}"
+            if limit and len(query) == 0:
+                sql += f" LIMIT {int(limit)}"
+            with self.store.lock:
+                rows = self.store.conn.execute(sql, params).fetchall()
+            for (text,) in rows:
+                doc = _loads(text)
+                if _matches(doc, query):
+                    yield doc
 
         def find_one(self, query):
-            if isinstance(query, dict) and "_id" in query:
-                return self.data.get(query["_id"])
-            return None
+            with self.store.lock:
+                return next(self._scan(query), None)
 
-        def insert_one(self, doc):
-            if "_id" in doc:
-                self.data[doc["_id"]] = doc
+        def find(self, query=None, projection=None):
+            return SQLiteCursor(self, query or {}, projection)
 
-        def update_one(self, query, update):
-            if isinstance(query, dict) and "_id" in query:
-                user_id = query["_id"]
-                if user_id in self.data and "$set" in update:
-                    self.data[user_id].update(update["$set"])
+        def count_documents(self, query):
+            if not query:
+                with self.store.lock:
+                    return self.store.conn.execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
+            return sum(1 for _ in self._scan(query))
 
-        def find(self, query=None):
-            return FallbackCursor(list(self.data.values()))
+        def insert_one(self, doc):
+            if "_id" not in doc:
+                doc["_id"] = uuid.uuid4().hex
+            self.store.write(f"INSERT OR IGNORE INTO {self.name} (id, doc) VALUES (?, ?)",
+                             (_dumps(doc["_id"]), _dumps(doc)))
+
+        def update_one(self, query, update, upsert=False):
+            self.find_one_and_update(query, update, upsert=upsert)
+
+        def find_one_and_update(self, query, update, return_document=None, upsert=False):
+            # The store lock makes the read-modify-write atomic, like Mongo's
+            with self.store.lock:
+                doc = self.find_one(query)
+                inserted = False
+                if doc is None and upsert and "_id" in query and not isinstance(query["_id"], dict):
+                    if self.find_one({"_id": query["_id"]}) is not None:
+                        return None  # the document exists, the filter just didn't match
+                    doc = {"_id": query["_id"]}
+                    if not _matches(doc, query):
+                        return None
+                    inserted = True
+                if doc is None:
+                    return None
+                _apply_update(doc, update, inserted)
+                self._put(doc)
+                return doc
 
         def delete_one(self, query):
-            if isinstance(query, dict) and "_id" in query:
-                self.data.pop(query["_id"], None)
-
-    class FallbackCursor:
-        def __init__(self, data):
-            self.data = data
+            with self.store.lock:
+                doc = self.find_one(query)
+                if doc is not None:
+                    self.store.write(f"DELETE FROM {self.name} WHERE id = ?", (_dumps(doc["_id"]),))
+
+    class SQLiteCursor:
+        def __init__(self, collection, query, projection=None):
+            self.collection = collection
+            self.query = query
+            self.projection = projection
+            self._sort = None
+            self._skip = 0
+            self._limit = 0
+
+        def sort(self, field, direction=1):
+            self._sort = (field, direction)
+            return self
 
-        def sort(self, field, direction):
-            if direction == -1:
-                self.data = sorted(self.data, key=lambda x: x.get(field, 0), reverse=True)
-            else:
-                self.data = sorted(self.data, key=lambda x: x.get(field, 0))
+        def skip(self, num):
+            self._skip = num
             return self
 
         def limit(self, num):
-            self.data = self.data[:num]
+            self._limit = num
             return self
 
         def __iter__(self):
-            return iter(self.data)
+            sql_limit = self._skip + self._limit if self._limit else 0
+            docs = self.collection._scan(self.query, self._sort, sql_limit)
+            end = self._skip + self._limit if self._limit else None
+            for i, doc in enumerate(docs):
+                if end is not None and i >= end:
+                    break
+                if i < self._skip:
+                    continue
+                if self.projection:
+                    doc = {key: value for key, value in doc.items()
+                           if key == "_id" or self.projection.get(key)}
+                yield doc
+
+    fallback_store = SQLiteStore(FALLBACK_DB_PATH)
+    users = SQLiteCollection(fallback_store, "users",
+                             indexes=[("balance",), ("level",), ("xp",), ("bot_banned",), ("shop_expires_at",)])
+    inventories = SQLiteCollection(fallback_store, "inventories")
+    marriages = SQLiteCollection(fallback_store, "marriages",
+                                 indexes=[("proposer", "proposee", "accepted"), ("accepted",)])
+    servers = SQLiteCollection(fallback_store, "servers")
+    print(f"Using SQLite fallback database at {FALLBACK_DB_PATH}")
+
+# Async data layer
+# pymongo is blocking, so every call is pushed onto a dedicated I/O thread pool
+# instead of stalling the event loop (and the gateway heartbeat) on a round trip.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "250"))
+db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="owo-db")
+
+# Per-operation latency: "collection.op" -> [calls, total_ms, max_ms]
+db_latency_stats = {}
+
+def record_db_latency(operation, elapsed_ms):
+    """Record the latency of a single database call"""
+    stats = db_latency_stats.get(operation)
+    if stats is None:
+        stats = db_latency_stats[operation] = [0, 0.0, 0.0]
+    stats[0] += 1
+    stats[1] += elapsed_ms
+    if elapsed_ms > stats[2]:
+        stats[2] = elapsed_ms
+    if elapsed_ms >= DB_SLOW_QUERY_MS:
+        print(f"Slow DB call {operation}: {elapsed_ms:.1f}ms")
+
+def format_db_latency(limit=5):
+    """Summarize the busiest database operations for display"""
+    busiest = sorted(db_latency_stats.items(), key=lambda x: x[1][0], reverse=True)[:limit]
+    lines = []
+    for operation, (calls, total_ms, max_ms) in busiest:
+        lines.append(f"`{operation}` {calls}x • avg {total_ms / calls:.1f}ms • max {max_ms:.1f}ms")
+    return "\n".join(lines) if lines else "No queries yet"
+
+class AsyncCollection:
+    """Awaitable wrapper around a pymongo (or fallback) collection"""
+
+    def __init__(self, collection, name):
+        self.collection = collection
+        self.name = name
+
+    async def _run(self, operation, func, *args, **kwargs):
+        start = perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(db_executor, partial(func, *args, **kwargs))
+        finally:
+            record_db_latency(f"{self.name}.{operation}", (perf_counter() - start) * 1000)
+
+    async def find_one(self, query):
+        return await self._run("find_one", self.collection.find_one, query)
+
+    async def insert_one(self, doc):
+        return await self._run("insert_one", self.collection.insert_one, doc)
+
+    async def update_one(self, query, update, upsert=False):
+        return await self._run("update_one", self.collection.update_one, query, update, upsert=upsert)
+
+    async def find_one_and_update(self, query, update, upsert=False):
+        """Apply an update atomically and return the document after it"""
+        return await self._run("find_one_and_update", self.collection.find_one_and_update,
+                               query, update, return_document=ReturnDocument.AFTER, upsert=upsert)
+
+    async def delete_one(self, query):
+        return await self._run("delete_one", self.collection.delete_one, query)
+
+    def _find_list(self, query, projection, sort, limit):
+        cursor = self.collection.find(query, projection) if projection else self.collection.find(query)
+        if sort:
+            cursor = cursor.sort(*sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    async def find(self, query=None, projection=None, sort=None, limit=0):
+        """Run a query and return the materialized results as a list"""
+        return await self._run("find", self._find_list, query or {}, projection, sort, limit)
+
+users_db = AsyncCollection(users, "users")
+inventories_db = AsyncCollection(inventories, "inventories")
+marriages_db = AsyncCollection(marriages, "marriages")
+
+# Index bootstrap
+# Every hot query shape needs an index behind it; without one, top/leaderboard
+# and the marriage lookups scan the whole collection on every call.
+REQUIRED_INDEXES = {
+    "users": [
+        ([("balance", -1)], {"name": "balance_desc"}),
+        ([("level", -1)], {"name": "level_desc"}),
+        ([("xp", -1)], {"name": "xp_desc"}),
+        ([("last_daily", -1)], {"name": "last_daily_desc"}),
+        ([("bot_banned", 1)], {"name": "bot_banned",
+                               "partialFilterExpression": {"bot_banned": True}}),
+        ([("shop_expires_at", 1)], {"name": "shop_expires_at", "sparse": True}),
+    ],
+    "marriages": [
+        ([("proposer", 1), ("proposee", 1), ("accepted", 1)], {"name": "proposer_proposee_accepted"}),
+        ([("accepted", 1)], {"name": "accepted"}),
+    ],
+}
+
+# (collection, description, query, sort) for every query the bot runs often
+HOT_QUERIES = [
+    ("users", "top balance", {}, [("balance", -1)]),
+    ("users", "top level", {}, [("level", -1)]),
+    ("users", "top xp", {}, [("xp", -1)]),
+    ("users", "leaderboard", {"_id": {"$in": [0]}}, [("balance", -1)]),
+    ("users", "active today", {"last_daily": {"$gte": datetime.datetime.now()}}, None),
+    ("users", "ban list", {"bot_banned": True}, None),
+    ("users", "expired shop effects", {"shop_expires_at": {"$lte": datetime.datetime.now()}}, None),
+    ("marriages", "pending proposal", {"proposer": 0, "proposee": 0, "accepted": False}, None),
+    ("marriages", "divorce", {"$or": [{"proposer": 0, "proposee": 0}, {"proposer": 0, "proposee": 0}],
+                              "accepted": True}, None),
+    ("marriages", "marriage count", {"accepted": True}, None),
+]
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _plan_stages(value)
+
+def _ensure_indexes():
+    collections = {"users": users, "marriages": marriages}
+    for name, indexes in REQUIRED_INDEXES.items():
+        for keys, options in indexes:
+            try:
+                collections[name].create_index(keys, **options)
+            except Exception as e:
+                print(f"Failed to create index {name}.{options['name']}: {e}")
+
+    for name, description, query, sort in HOT_QUERIES:
+        try:
+            cursor = collections[name].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = cursor.limit(10).explain().get("queryPlanner", {}).get("winningPlan", {})
+            if "COLLSCAN" in set(_plan_stages(plan)):
+                print(f"⚠️ Query plan for {name} '{description}' is a COLLSCAN")
+        except Exception as e:
+            print(f"Failed to explain {name} '{description}': {e}")
+
+async def ensure_indexes():
+    """Create the required indexes and check the hot query plans use them"""
+    if mongo_client is None:
+        return
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(db_executor, _ensure_indexes)
+    print("Database indexes verified")
+
+# In-process caches
+class LRUCache:
+    """Bounded mapping with least-recently-used and time-to-live eviction"""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key):
+        """Return a live entry without touching recency or hit counters"""
+        entry = self._data.get(key)
+        if entry is None or (entry[0] is not None and entry[0] <= monotonic()):
+            return None
+        return entry[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+# User documents keyed by user id; update_user_data writes through to it so a
+# command (plus the ban checks in front of it) costs at most one find_one
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "5000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+user_cache = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+# Leaderboards
+# Every tracked metric is kept as a sorted list of (-value, user_id), updated
+# incrementally by the write paths, so top/leaderboard never sort the collection.
+LEADERBOARD_FIELDS = {"balance": 0, "level": 1, "xp": 0}
+GUILD_LEADERBOARD_TTL = float(os.getenv("GUILD_LEADERBOARD_TTL", "600"))
+
+class SortedBoard:
+    """Users ordered by one metric, highest first"""
+
+    def __init__(self):
+        self.entries = []
+        self.values = {}
+
+    def update(self, user_id, value):
+        old = self.values.get(user_id)
+        if old is not None:
+            if old == value:
+                return
+            del self.entries[bisect_left(self.entries, (-old, user_id))]
+        self.values[user_id] = value
+        insort(self.entries, (-value, user_id))
+
+    def top(self, limit):
+        return [user_id for _, user_id in self.entries[:limit]]
+
+class LeaderboardService:
+    """Global and per-guild rankings for balance, level and xp"""
+
+    def __init__(self):
+        self.snapshots = {}
+        self.boards = {metric: SortedBoard() for metric in LEADERBOARD_FIELDS}
+        # Guards the global boards against readers on other threads (the dashboard)
+        self.lock = threading.Lock()
+        # guild_id -> (built_at, {metric: SortedBoard}); rebuilt after a TTL so
+        # membership changes are picked up
+        self.guild_boards = {}
+        self.member_guilds = {}
+
+    def record(self, user_id, fields):
+        """Fold a user's new balance/level/xp/rank into the rankings"""
+        changed = [metric for metric in LEADERBOARD_FIELDS if metric in fields]
+        if not changed and "rank" not in fields:
+            return
+        with self.lock:
+            self._record(user_id, fields, changed)
+
+    def _record(self, user_id, fields, changed):
+        snapshot = self.snapshots.get(user_id)
+        if snapshot is None:
+            if "_id" not in fields:
+                return  # partial update for a user we never loaded
+            snapshot = self.snapshots[user_id] = {"_id": user_id, "rank": "Peasant", **LEADERBOARD_FIELDS}
+            changed = list(LEADERBOARD_FIELDS)
+            self._join_guilds(user_id)
+        if "rank" in fields:
+            snapshot["rank"] = fields["rank"]
+        for metric in changed:
+            value = fields.get(metric)
+            if not isinstance(value, (int, float)):
+                value = LEADERBOARD_FIELDS[metric]
+            snapshot[metric] = value
+            self.boards[metric].update(user_id, value)
+            for guild_id in self.member_guilds.get(user_id, ()):
+                self.guild_boards[guild_id][1][metric].update(user_id, value)
+
+    def _join_guilds(self, user_id):
+        # A brand new user still has to show up on the guild boards already built
+        for guild_id in self.guild_boards:
+            guild = bot.get_guild(guild_id)
+            if guild is not None and guild.get_member(user_id) is not None:
+                self.member_guilds.setdefault(user_id, set()).add(guild_id)
+
+    def _boards_for_guild(self, guild):
+        built = self.guild_boards.get(guild.id)
+        if built is not None and monotonic() - built[0] < GUILD_LEADERBOARD_TTL:
+            return built[1]
+        if built is not None:
+            for user_id in built[1]["balance"].values:
+                self.member_guilds.get(user_id, set()).discard(guild.id)
+
+        boards = {metric: SortedBoard() for metric in LEADERBOARD_FIELDS}
+        for member in guild.members:
+            snapshot = self.snapshots.get(member.id)
+            if member.bot or snapshot is None:
+                continue
+            self.member_guilds.setdefault(member.id, set()).add(guild.id)
+            for metric, board in boards.items():
+                board.update(member.id, snapshot[metric])
+        self.guild_boards[guild.id] = (monotonic(), boards)
+        return boards
+
+    def top(self, metric, limit=10, guild=None):
+        """Return snapshots of the highest ranked users, optionally within one guild"""
+        board = self._boards_for_guild(guild)[metric] if guild is not None else self.boards[metric]
+        return [dict(self.snapshots[user_id]) for user_id in board.top(limit)]
+
+    def snapshot_top(self, metric, limit=10):
+        """Thread-safe copy of the global top users, for callers off the event loop"""
+        with self.lock:
+            return [dict(self.snapshots[user_id]) for user_id in self.boards[metric].top(limit)]
+
+    async def load(self):
+        """Build the global boards from the users collection"""
+        docs = await users_db.find(projection={"balance": 1, "level": 1, "xp": 1, "rank": 1})
+        for doc in docs:
+            self.record(doc["_id"], doc)
+        self.guild_boards.clear()
+        self.member_guilds.clear()
+        print(f"Loaded leaderboards for {len(self.snapshots)} users")
+
+leaderboards = LeaderboardService()
+
+# Display names
+# Rankings and profiles only need names, so the gateway cache is tried first and
+# the REST API is only hit for users the bot can't see, a few at a time.
+DISPLAY_NAME_TTL = float(os.getenv("DISPLAY_NAME_TTL", "3600"))
+DISPLAY_NAME_FETCH_LIMIT = int(os.getenv("DISPLAY_NAME_FETCH_LIMIT", "5"))
+display_name_cache = LRUCache(10000, DISPLAY_NAME_TTL)
+display_name_fetches = asyncio.Semaphore(DISPLAY_NAME_FETCH_LIMIT)
+
+async def _fetch_display_name(user_id):
+    async with display_name_fetches:
+        try:
+            user = await bot.fetch_user(user_id)
+        except Exception as e:
+            print(f"Failed to fetch user {user_id}: {e}")
+            return None
+    display_name_cache.set(user_id, user.display_name)
+    return user.display_name
+
+async def resolve_display_names(user_ids, guild=None):
+    """Map user ids to display names, fetching only the ones no cache has"""
+    names = {}
+    missing = []
+    for user_id in user_ids:
+        user = (guild.get_member(user_id) if guild else None) or bot.get_user(user_id)
+        if user is not None:
+            names[user_id] = user.display_name
+            continue
+        cached = display_name_cache.get(user_id)
+        if cached is not None:
+            names[user_id] = cached
+        else:
+            missing.append(user_id)
+
+    if missing:
+        fetched = await asyncio.gather(*(_fetch_display_name(user_id) for user_id in missing))
+        for user_id, name in zip(missing, fetched):
+            if name is not None:
+                names[user_id] = name
+    return names
 
-    users = FallbackCollection(users_data)
-    inventories = FallbackCollection(inventories_data)
-    marriages = FallbackCollection(marriages_data)
-    servers = FallbackCollection({})
+async def resolve_display_name(user_id, guild=None):
+    """Resolve a single display name, falling back to a mention"""
+    names = await resolve_display_names([user_id], guild)
+    return names.get(user_id, f"<@{user_id}>")
 
 # Bot setup
 intents = discord.Intents.all()
-bot = commands.Bot(command_prefix='owo ', intents=intents)
+
+# Outbound HTTP
+# One pooled session for Tenor, meme-api, thecatapi and dog.ceo, so repeat
+# commands reuse warm keep-alive connections instead of a new TLS handshake each time.
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "100"))
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+
+def create_http_session():
+    """Create the process-wide aiohttp session"""
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_SIZE,
+        limit_per_host=HTTP_POOL_PER_HOST,
+        ttl_dns_cache=300,
+        keepalive_timeout=60
+    )
+    timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT, connect=5)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+class OwOBot(commands.Bot):
+    http_session = None
+
+    async def setup_hook(self):
+        """Load shared state before connecting to the gateway"""
+        self.http_session = create_http_session()
+        load_gif_pools()
+        self.gif_warmup = asyncio.create_task(warm_gif_pools())
+        await ensure_indexes()
+        await load_banned_users()
+        await leaderboards.load()
+        if REDIS_URL:
+            await cooldowns.connect(REDIS_URL)
+        refresh_banned_users.start()
+        sweep_cooldowns.start()
+        sweep_shop_effects.start()
+
+    async def close(self):
+        save_gif_pools()
+        await refund_blackjack_games()
+        await super().close()
+        await cooldowns.close()
+        if self.http_session is not None:
+            await self.http_session.close()
+
+bot = OwOBot(command_prefix='owo ', intents=intents)
 bot.remove_command('help')
 
 # Owner ID
@@ -147,100 +846,307 @@ def calculate_crime_bonus(level):
     level_multiplier = 1 + (level * 0.15)
     return (int(base_min * level_multiplier), int(base_max * level_multiplier))
 
+# Level curve
+# A user's level is the highest L with calculate_xp_for_level(L) <= xp. The
+# thresholds are precomputed so level_for_xp (and grant_reward) is one bisect
+# instead of an O(level) loop.
+LEVEL_TABLE_SIZE = 10000
+LEVEL_XP_THRESHOLDS = array("q", (int(100 * (level ** 1.5)) for level in range(1, LEVEL_TABLE_SIZE + 1)))
+# LEVEL_XP_TOTALS[L] is the XP of every level up to L combined (used by setlevel)
+LEVEL_XP_TOTALS = array("q", [0])
+for _threshold in LEVEL_XP_THRESHOLDS:
+    LEVEL_XP_TOTALS.append(LEVEL_XP_TOTALS[-1] + _threshold)
+del _threshold
+
 def calculate_xp_for_level(level):
     """Calculate XP required for a level"""
+    if 0 < level <= LEVEL_TABLE_SIZE:
+        return LEVEL_XP_THRESHOLDS[level - 1]
     return int(100 * (level ** 1.5))
 
+def level_for_xp(xp):
+    """Highest level whose XP requirement is met (0 below the first threshold)"""
+    level = bisect_right(LEVEL_XP_THRESHOLDS, xp)
+    if level < LEVEL_TABLE_SIZE:
+        return level
+    # Past the table: invert the curve, then correct for int() rounding
+    level = int((xp / 100) ** (2 / 3))
+    while calculate_xp_for_level(level + 1) <= xp:
+        level += 1
+    while calculate_xp_for_level(level) > xp:
+        level -= 1
+    return level
+
+def total_xp_for_level(level):
+    """Combined XP of levels 1..level"""
+    if 0 <= level <= LEVEL_TABLE_SIZE:
+        return LEVEL_XP_TOTALS[level]
+    return LEVEL_XP_TOTALS[-1] + sum(calculate_xp_for_level(i) for i in range(LEVEL_TABLE_SIZE + 1, level + 1))
+
 # Simple bot responses for mentions
-def get_simple_bot_response(message):
-    """Simple bot responses for mentions (fallback when AI is unavailable)"""
+# Intents in priority order: when a message hits keywords from several intents,
+# the earlier one wins. Keywords match anywhere in the lowercased message.
+CANNED_INTENTS = [
+    ("greeting", ["hello", "hi", "hey", "greetings"]),
+    ("status", ["how are you", "how's it going", "what's up"]),
+    ("thanks", ["thank", "thanks", "appreciate"]),
+    ("goodbye", ["bye", "goodbye", "see you", "farewell"]),
+    ("help", ["help", "what can you do", "commands"]),
+    ("math", ["math", "calculate"]),
+    ("joke", ["joke", "funny"]),
+]
+
+CANNED_RESPONSES = {
+    "greeting": [
+        "Hello! How can I help you today?",
+        "Hi there! What's up?",
+        "Hey! Nice to see you!",
+        "Greetings! What can I do for you?"
+    ],
+    "status": [
+        "I'm doing great! Thanks for asking! 😊",
+        "All good here! How about you?",
+        "I'm running smoothly! What brings you here?"
+    ],
+    "thanks": [
+        "You're welcome! Happy to help! 😊",
+        "No problem at all!",
+        "Glad I could help!"
+    ],
+    "goodbye": [
+        "Goodbye! Have a great day! 👋",
+        "See you later! 😊",
+        "Take care! Come back anytime!"
+    ],
+    "help": ["I'm a Discord bot with economy, games, and social features! Use `owo help` to see all my commands! 🎮"],
+    "math": ["I can do simple math! Try `owo math 2+2` for calculations! 🧮"],
+    "joke": [
+        "Why don't scientists trust atoms? Because they make up everything! 😄",
+        "I told my wife she was drawing her eyebrows too high. She looked surprised! 😂",
+        "Why don't eggs tell jokes? They'd crack each other up! 🥚"
+    ],
+}
+
+# One compiled alternation per intent, tried in priority order; each search is a
+# single C-level scan, so the first intent that matches wins without a Python loop
+# over every keyword.
+CANNED_MATCHERS = [
+    (intent, re.compile("|".join(re.escape(keyword) for keyword in keywords)))
+    for intent, keywords in CANNED_INTENTS
+]
+
+def classify_message(message):
+    """Return the highest priority canned intent in a message, or None"""
     message_lower = message.lower()
+    for intent, matcher in CANNED_MATCHERS:
+        if matcher.search(message_lower):
+            return intent
+    return None
+
+def get_canned_response(message):
+    """Keyword-matched responses for mentions, or None if nothing matches"""
+    intent = classify_message(message)
+    if intent is None:
+        return None
+    return random.choice(CANNED_RESPONSES[intent])
 
-    # Greeting responses
-    if any(word in message_lower for word in ["hello", "hi", "hey", "greetings"]):
-        responses = [
-            "Hello! How can I help you today?",
-            "Hi there! What's up?",
-            "Hey! Nice to see you!",
-            "Greetings! What can I do for you?"
-        ]
-        return random.choice(responses)
-
-    # Status responses
-    elif any(word in message_lower for word in ["how are you", "how's it going", "what's up"]):
-        responses = [
-            "I'm doing great! Thanks for asking! 😊",
-            "All good here! How about you?",
-            "I'm running smoothly! What brings you here?"
-        ]
-        return random.choice(responses)
-
-    # Thank you responses
-    elif any(word in message_lower for word in ["thank", "thanks", "appreciate"]):
-        responses = [
-            "You're welcome! Happy to help! 😊",
-            "No problem at all!",
-            "Glad I could help!"
-        ]
-        return random.choice(responses)
-
-    # Goodbye responses
-    elif any(word in message_lower for word in ["bye", "goodbye", "see you", "farewell"]):
-        responses = [
-            "Goodbye! Have a great day! 👋",
-            "See you later! 😊",
-            "Take care! Come back anytime!"
-        ]
-        return random.choice(responses)
-
-    # Help/capabilities
-    elif any(word in message_lower for word in ["help", "what can you do", "commands"]):
-        return "I'm a Discord bot with economy, games, and social features! Use `owo help` to see all my commands! 🎮"
-
-    # Math questions
-    elif any(word in message_lower for word in ["math", "calculate"]):
-        return "I can do simple math! Try `owo math 2+2` for calculations! 🧮"
-
-    # Fun responses
-    elif any(word in message_lower for word in ["joke", "funny"]):
-        jokes = [
-            "Why don't scientists trust atoms? Because they make up everything! 😄",
-            "I told my wife she was drawing her eyebrows too high. She looked surprised! 😂",
-            "Why don't eggs tell jokes? They'd crack each other up! 🥚"
-        ]
-        return random.choice(jokes)
+def get_simple_bot_response(message):
+    """Simple bot responses for mentions (fallback when AI is unavailable)"""
+    response = get_canned_response(message)
+    if response is not None:
+        return response
 
-    # Default responses
+    responses = [
+        "That's interesting! Tell me more! 🤔",
+        "I see! What would you like to know? 😊",
+        "Cool! How can I help you today? ✨",
+        "Nice! What brings you here? 🎮",
+        "Awesome! What can I do for you? 🌟"
+    ]
+    return random.choice(responses)
+
+# Groq AI chat
+# Completions go through the async client so a slow model never stalls the event
+# loop. A semaphore caps the calls in flight and anything beyond the queue limit
+# gets a canned response instead of waiting.
+AI_MODEL = "llama3-8b-8192"
+AI_SYSTEM_PROMPT = "You are a friendly, aesthetic, and helpful Discord bot named OwO. You are enthusiastic and use emojis. Keep responses concise (under 1000 characters)."
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+AI_MAX_QUEUE = int(os.getenv("AI_MAX_QUEUE", "16"))
+ai_slots = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+ai_pending = 0
+
+# People mention the bot with the same handful of prompts, so answers are
+# cached by normalized prompt and repeats never reach Groq
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "1000"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "3600"))
+AI_STREAM_EDIT_INTERVAL = 1.0  # Discord rate limits message edits
+ai_response_cache = LRUCache(AI_CACHE_SIZE, AI_CACHE_TTL)
+PROMPT_NOISE = re.compile(r"[^\w\s]+")
+
+# Token buckets in front of Groq: per user, per guild and one global budget.
+# A user or guild over its budget gets a canned reply straight away. When only
+# the global budget is short, requests wait their turn in FIFO order for a bounded time.
+AI_USER_RATE = (3, 5 / 60)        # burst, tokens per second
+AI_GUILD_RATE = (10, 30 / 60)
+AI_GLOBAL_RATE = (10, 30 / 60)
+AI_GLOBAL_MAX_WAIT = float(os.getenv("AI_GLOBAL_MAX_WAIT", "5"))
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate tokens per second"""
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = monotonic()
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def refund(self):
+        """Give back a token taken for a request that was rejected further on"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def wait_time(self):
+        """Seconds until a token will be available"""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+ai_user_buckets = LRUCache(10000)
+ai_guild_buckets = LRUCache(2000)
+ai_global_bucket = TokenBucket(*AI_GLOBAL_RATE)
+ai_global_queue = asyncio.Lock()  # asyncio.Lock wakes waiters in FIFO order
+ai_global_waiting = 0
+
+def _ai_bucket(buckets, key, rate):
+    bucket = buckets.get(key)
+    if bucket is None:
+        bucket = TokenBucket(*rate)
+        buckets.set(key, bucket)
+    return bucket
+
+async def _take_global_ai_token():
+    global ai_global_waiting
+    if not ai_global_queue.locked() and ai_global_bucket.try_take():
+        return True
+    if ai_global_waiting >= AI_MAX_QUEUE:
+        return False
+
+    ai_global_waiting += 1
+    try:
+        async with ai_global_queue:
+            wait = ai_global_bucket.wait_time()
+            if wait > AI_GLOBAL_MAX_WAIT:
+                return False
+            await asyncio.sleep(wait)
+            return ai_global_bucket.try_take()
+    finally:
+        ai_global_waiting -= 1
+
+async def allow_ai_request(user_id, guild_id=None):
+    """Check the user, guild and global AI budgets
+
+    Tokens already taken are refunded when a later budget rejects the request"""
+    taken = []
+    buckets = [_ai_bucket(ai_user_buckets, user_id, AI_USER_RATE)]
+    if guild_id is not None:
+        buckets.append(_ai_bucket(ai_guild_buckets, guild_id, AI_GUILD_RATE))
+    for bucket in buckets:
+        if not bucket.try_take():
+            break
+        taken.append(bucket)
     else:
-        if groq_client:
-            try:
-                response = groq_client.chat.completions.create(
-                    messages=[
-                        {"role": "system", "content": "You are a friendly, aesthetic, and helpful Discord bot named OwO. You are enthusiastic and use emojis. Keep responses concise (under 1000 characters)."},
-                        {"role": "user", "content": message}
-                    ],
-                    model="llama3-8b-8192",
-                )
-                return response.choices[0].message.content
-            except Exception as e:
-                print(f"Groq AI error: {e}")
-        
-        responses = [
-            "That's interesting! Tell me more! 🤔",
-            "I see! What would you like to know? 😊",
-            "Cool! How can I help you today? ✨",
-            "Nice! What brings you here? 🎮",
-            "Awesome! What can I do for you? 🌟"
-        ]
-        return random.choice(responses)
+        if await _take_global_ai_token():
+            return True
+
+    for bucket in taken:
+        bucket.refund()
+    return False
+
+def normalize_prompt(message):
+    """Reduce a prompt to lowercase words so trivial variations share a cache entry"""
+    return " ".join(PROMPT_NOISE.sub(" ", message.lower()).split())
+
+async def _stream_completion(message, on_partial, parts):
+    """Stream a completion into parts; returns the text, and parts keeps what
+    arrived even if the stream is cut off"""
+    stream = await groq_client.chat.completions.create(
+        messages=[
+            {"role": "system", "content": AI_SYSTEM_PROMPT},
+            {"role": "user", "content": message}
+        ],
+        model=AI_MODEL,
+        stream=True,
+    )
+    last_push = 0.0
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta:
+            continue
+        parts.append(delta)
+        text = "".join(parts)
+        # Discord rejects a whitespace-only message, so wait for real text
+        if on_partial is not None and text.strip() and monotonic() - last_push >= AI_STREAM_EDIT_INTERVAL:
+            last_push = monotonic()
+            await on_partial(text)
+    return "".join(parts).strip()
+
+async def get_ai_response(message, on_partial=None, user_id=None, guild_id=None):
+    """Ask Groq for a reply, or None if the AI is unavailable, overloaded or rate limited
+
+    on_partial is awaited with the text so far while the completion streams in"""
+    global ai_pending
+    # Mention-only or punctuation-only prompts normalize to "" and are never cached
+    key = normalize_prompt(message)
+    cached = ai_response_cache.get(key) if key else None
+    if cached is not None:
+        return cached
+    if groq_client is None or ai_pending >= AI_MAX_CONCURRENCY + AI_MAX_QUEUE:
+        return None
+    if user_id is not None and not await allow_ai_request(user_id, guild_id):
+        return None
+
+    ai_pending += 1
+    parts = []
+    try:
+        async with ai_slots:
+            response = await asyncio.wait_for(_stream_completion(message, on_partial, parts), GROQ_TIMEOUT)
+    except Exception as e:
+        print(f"Groq AI error: {e!r}")
+        # Part of the answer may already be on screen; finish with that rather
+        # than replacing it with a canned line. It's incomplete, so not cached
+        partial = "".join(parts).strip()
+        return partial if on_partial is not None and partial else None
+    finally:
+        ai_pending -= 1
+
+    if not response:
+        return None
+    if key:
+        ai_response_cache.set(key, response)
+    return response
+
+async def get_bot_response(message, on_partial=None, user_id=None, guild_id=None):
+    """Reply to a mention: canned topics first, then the AI, then a generic fallback"""
+    response = get_canned_response(message)
+    if response is None:
+        response = await get_ai_response(message, on_partial, user_id, guild_id)
+    return response or get_simple_bot_response(message)
 
 # Tenor API Integration for Anime GIFs
 TENOR_API_KEY = os.getenv('TENOR_API_KEY')
 
-# Cache for GIF URLs to reduce API calls
-gif_cache = {}
-cache_expiry = {}
-
 # Anime action search terms for Tenor API
 ANIME_SEARCH_TERMS = {
     "hug": "anime hug",
@@ -261,103 +1167,192 @@ ANIME_SEARCH_TERMS = {
     "anime kick": "anime kick martial arts"
 }
 
-async def get_anime_gif(action):
-    """Get a random anime GIF from Tenor API"""
-    if not TENOR_API_KEY:
-        print("Warning: TENOR_API_KEY not found, using fallback GIF")
-        # Return action-specific fallback GIFs
-        fallback_gifs = {
-            "hug": "https://media.tenor.com/K9lT_pKV0vMAAAAC/anime-hug.gif",
-            "kiss": "https://media.tenor.com/LCYQBk_jcpoAAAAC/anime-kiss.gif",
-            "slap": "https://media.tenor.com/6fJoVJaTgbAAAAAC/anime-slap.gif",
-            "punch": "https://media.tenor.com/XN_5Q3Wok-YAAAAC/anime-punch.gif",
-            "cuddle": "https://media.tenor.com/h_Wng1bWH40AAAAC/anime-cuddle.gif",
-            "pat": "https://media.tenor.com/b60jfhRgcEcAAAAC/anime-pat.gif",
-            "poke": "https://media.tenor.com/j1lMpnkGRwUAAAAC/anime-poke.gif",
-            "bite": "https://media.tenor.com/kH1sr4JK8gsAAAAC/anime-bite.gif",
-            "tickle": "https://media.tenor.com/lPCR_wQNF8QAAAAC/anime-tickle.gif",
-            "blush": "https://media.tenor.com/lW-dHTqkxWAAAAAC/anime-blush.gif",
-            "cry": "https://media.tenor.com/H_lKULYKuQkAAAAC/anime-cry.gif",
-            "dance": "https://media.tenor.com/yMBovJrYSf8AAAAC/anime-dance.gif",
-            "happy": "https://media.tenor.com/k6qgJeJTOgsAAAAC/anime-happy.gif",
-            "pout": "https://media.tenor.com/T8LWyxT8A0cAAAAC/anime-pout.gif",
-            "anime nsfw": "https://media.tenor.com/eKHuKbDxnXMAAAAC/anime-romantic.gif",
-            "anime kick": "https://media.tenor.com/XN_5Q3Wok-YAAAAC/anime-martial-arts.gif"
-        }
-        return fallback_gifs.get(action, "https://media.tenor.com/eKHuKbDxnXMAAAAC/anime-happy.gif")
+# Fallback GIFs when Tenor is unavailable
+DEFAULT_GIF = "https://media.tenor.com/eKHuKbDxnXMAAAAC/anime-happy.gif"
+FALLBACK_GIFS = {
+    "hug": "https://media.tenor.com/K9lT_pKV0vMAAAAC/anime-hug.gif",
+    "kiss": "https://media.tenor.com/LCYQBk_jcpoAAAAC/anime-kiss.gif",
+    "slap": "https://media.tenor.com/6fJoVJaTgbAAAAAC/anime-slap.gif",
+    "punch": "https://media.tenor.com/XN_5Q3Wok-YAAAAC/anime-punch.gif",
+    "cuddle": "https://media.tenor.com/h_Wng1bWH40AAAAC/anime-cuddle.gif",
+    "pat": "https://media.tenor.com/b60jfhRgcEcAAAAC/anime-pat.gif",
+    "poke": "https://media.tenor.com/j1lMpnkGRwUAAAAC/anime-poke.gif",
+    "bite": "https://media.tenor.com/kH1sr4JK8gsAAAAC/anime-bite.gif",
+    "tickle": "https://media.tenor.com/lPCR_wQNF8QAAAAC/anime-tickle.gif",
+    "blush": "https://media.tenor.com/lW-dHTqkxWAAAAAC/anime-blush.gif",
+    "cry": "https://media.tenor.com/H_lKULYKuQkAAAAC/anime-cry.gif",
+    "dance": "https://media.tenor.com/yMBovJrYSf8AAAAC/anime-dance.gif",
+    "happy": "https://media.tenor.com/k6qgJeJTOgsAAAAC/anime-happy.gif",
+    "pout": "https://media.tenor.com/T8LWyxT8A0cAAAAC/anime-pout.gif",
+    "anime nsfw": "https://media.tenor.com/eKHuKbDxnXMAAAAC/anime-romantic.gif",
+    "anime kick": "https://media.tenor.com/XN_5Q3Wok-YAAAAC/anime-martial-arts.gif"
+}
 
-    # Check if we have cached GIFs for this action
-    now = datetime.datetime.now()
-    cache_key = action
+# GIF pools
+# Each action keeps a pool of Tenor results. Expired pools keep being served
+# while a single background request refreshes them, and concurrent misses for
+# the same action share one request instead of stampeding Tenor.
+GIF_POOL_LIMIT = int(os.getenv("GIF_POOL_LIMIT", "128"))
+GIF_POOL_TTL = float(os.getenv("GIF_POOL_TTL", "1800"))
+GIF_POOL_REFRESH_AHEAD = 300  # seconds before expiry that a hit triggers a refresh
+
+class GifPoolCache:
+    """Bounded per-action GIF pools with single-flight, stale-while-revalidate refresh"""
+
+    def __init__(self, maxsize, ttl, refresh_ahead):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.pools = OrderedDict()  # action -> (expires_at, urls)
+        self.inflight = {}          # action -> asyncio.Task
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.pools)
+
+    def set(self, action, urls, expires_at=None):
+        self.pools[action] = (monotonic() + self.ttl if expires_at is None else expires_at, urls)
+        self.pools.move_to_end(action)
+        while len(self.pools) > self.maxsize:
+            self.pools.popitem(last=False)
+
+    async def get(self, action, fetch):
+        """Return the pool for action, calling fetch(action) at most once at a time"""
+        entry = self.pools.get(action)
+        if entry is None:
+            self.misses += 1
+            return await asyncio.shield(self.refresh(action, fetch))
+
+        self.pools.move_to_end(action)
+        expires_at, urls = entry
+        now = monotonic()
+        if now >= expires_at:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        if now >= expires_at - self.refresh_ahead:
+            self.refresh(action, fetch)
+        return urls
+
+    def refresh(self, action, fetch):
+        """Start (or join) the background refresh for an action"""
+        task = self.inflight.get(action)
+        if task is None:
+            task = self.inflight[action] = asyncio.create_task(self._load(action, fetch))
+        return task
+
+    async def _load(self, action, fetch):
+        try:
+            urls = await fetch(action)
+            if urls:
+                self.set(action, urls)
+                return urls
+        except Exception as e:
+            print(f"Error refreshing GIF pool for {action}: {e}")
+        finally:
+            self.inflight.pop(action, None)
+        entry = self.pools.get(action)
+        return entry[1] if entry else None
+
+    def dump(self):
+        """Serializable copy of the pools with their remaining lifetime"""
+        now = monotonic()
+        return {action: {"ttl": expires_at - now, "urls": urls}
+                for action, (expires_at, urls) in self.pools.items()}
+
+    def restore(self, pools, age=0):
+        """Load pools from dump(); entries older than their ttl come back stale"""
+        now = monotonic()
+        for action, entry in pools.items():
+            if entry.get("urls"):
+                self.set(action, entry["urls"], expires_at=now + entry.get("ttl", 0) - age)
+
+    def stats(self):
+        total = self.hits + self.stale_hits + self.misses
+        rate = (self.hits + self.stale_hits) / total if total else 0.0
+        return f"{len(self.pools)} pools • {rate:.0%} hit rate • {self.misses} misses"
+
+gif_pools = GifPoolCache(GIF_POOL_LIMIT, GIF_POOL_TTL, GIF_POOL_REFRESH_AHEAD)
+
+async def fetch_tenor_gifs(action):
+    """Search Tenor for an action's GIF pool"""
+    params = {
+        "q": ANIME_SEARCH_TERMS.get(action, f"anime {action}"),
+        "key": TENOR_API_KEY,
+        "limit": 20,  # Get 20 GIFs for variety
+        "media_filter": "gif",
+        "contentfilter": "medium"
+    }
+    async with bot.http_session.get("https://tenor.googleapis.com/v2/search", params=params) as response:
+        if response.status != 200:
+            print(f"Failed to fetch GIF from Tenor API for {action}, status: {response.status}")
+            return None
+        data = await response.json()
+
+    gif_urls = []
+    for result in data.get("results", []):
+        gif_url = result.get("media_formats", {}).get("gif", {}).get("url")
+        if gif_url:
+            gif_urls.append(gif_url)
+    return gif_urls
+
+# Pools are saved to disk so a restart serves GIFs straight away (stale until
+# revalidated) and warmed in the background for every action at startup
+GIF_POOL_FILE = os.getenv("GIF_POOL_FILE", "gif_pools.json")
+GIF_WARM_CONCURRENCY = 4
+
+def load_gif_pools():
+    """Restore GIF pools saved by a previous run"""
+    try:
+        with open(GIF_POOL_FILE) as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        print(f"Failed to load GIF pools: {e}")
+        return
+    age = datetime.datetime.now().timestamp() - saved.get("saved_at", 0)
+    gif_pools.restore(saved.get("pools", {}), age)
+    print(f"Restored {len(gif_pools)} GIF pools from {GIF_POOL_FILE}")
 
-    # If cache exists and is not expired (cache for 30 minutes)
-    if (cache_key in gif_cache and
-        cache_key in cache_expiry and
-        now < cache_expiry[cache_key]):
-        gifs = gif_cache[cache_key]
-        if gifs:
-            return random.choice(gifs)
+def save_gif_pools():
+    """Write the GIF pools to disk"""
+    data = {"saved_at": datetime.datetime.now().timestamp(), "pools": gif_pools.dump()}
+    try:
+        tmp_path = GIF_POOL_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, GIF_POOL_FILE)
+    except Exception as e:
+        print(f"Failed to save GIF pools: {e}")
 
-    # Get search term for the action
-    search_term = ANIME_SEARCH_TERMS.get(action, f"anime {action}")
+async def warm_gif_pools():
+    """Fetch a fresh pool for every anime action, a few at a time"""
+    if not TENOR_API_KEY:
+        return
+    slots = asyncio.Semaphore(GIF_WARM_CONCURRENCY)
 
-    try:
-        # Make API request to Tenor
-        async with aiohttp.ClientSession() as session:
-            url = f"https://tenor.googleapis.com/v2/search"
-            params = {
-                "q": search_term,
-                "key": TENOR_API_KEY,
-                "limit": 20,  # Get 20 GIFs for variety
-                "media_filter": "gif",
-                "contentfilter": "medium"
-            }
-
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    results = data.get("results", [])
-
-                    if results:
-                        # Extract GIF URLs
-                        gif_urls = []
-                        for result in results:
-                            media_formats = result.get("media_formats", {})
-                            gif_url = media_formats.get("gif", {}).get("url")
-                            if gif_url:
-                                gif_urls.append(gif_url)
-
-                        if gif_urls:
-                            # Cache the GIFs for 30 minutes
-                            gif_cache[cache_key] = gif_urls
-                            cache_expiry[cache_key] = now + datetime.timedelta(minutes=30)
-
-                            return random.choice(gif_urls)
-
-                print(f"Failed to fetch GIF from Tenor API for {action}, status: {response.status}")
+    async def warm(action):
+        async with slots:
+            await gif_pools.refresh(action, fetch_tenor_gifs)
 
-    except Exception as e:
-        print(f"Error fetching GIF from Tenor API: {e}")
-
-    # Fallback GIF if API fails
-    fallback_gifs = {
-        "hug": "https://media.tenor.com/K9lT_pKV0vMAAAAC/anime-hug.gif",
-        "kiss": "https://media.tenor.com/LCYQBk_jcpoAAAAC/anime-kiss.gif",
-        "slap": "https://media.tenor.com/6fJoVJaTgbAAAAAC/anime-slap.gif",
-        "punch": "https://media.tenor.com/XN_5Q3Wok-YAAAAC/anime-punch.gif",
-        "cuddle": "https://media.tenor.com/h_Wng1bWH40AAAAC/anime-cuddle.gif",
-        "pat": "https://media.tenor.com/b60jfhRgcEcAAAAC/anime-pat.gif",
-        "poke": "https://media.tenor.com/j1lMpnkGRwUAAAAC/anime-poke.gif",
-        "bite": "https://media.tenor.com/kH1sr4JK8gsAAAAC/anime-bite.gif",
-        "tickle": "https://media.tenor.com/lPCR_wQNF8QAAAAC/anime-tickle.gif",
-        "blush": "https://media.tenor.com/lW-dHTqkxWAAAAAC/anime-blush.gif",
-        "cry": "https://media.tenor.com/H_lKULYKuQkAAAAC/anime-cry.gif",
-        "dance": "https://media.tenor.com/yMBovJrYSf8AAAAC/anime-dance.gif",
-        "happy": "https://media.tenor.com/k6qgJeJTOgsAAAAC/anime-happy.gif",
-        "pout": "https://media.tenor.com/T8LWyxT8A0cAAAAC/anime-pout.gif"
-    }
+    start = perf_counter()
+    await asyncio.gather(*(warm(action) for action in ANIME_SEARCH_TERMS))
+    save_gif_pools()
+    print(f"Warmed {len(ANIME_SEARCH_TERMS)} GIF pools in {perf_counter() - start:.1f}s")
 
-    return fallback_gifs.get(action, "https://media.tenor.com/eKHuKbDxnXMAAAAC/anime-happy.gif")
+async def get_anime_gif(action):
+    """Get a random anime GIF from Tenor API"""
+    if not TENOR_API_KEY:
+        print("Warning: TENOR_API_KEY not found, using fallback GIF")
+        return FALLBACK_GIFS.get(action, DEFAULT_GIF)
+
+    gifs = await gif_pools.get(action, fetch_tenor_gifs)
+    if gifs:
+        return random.choice(gifs)
+    return FALLBACK_GIFS.get(action, DEFAULT_GIF)
 
 HUNT_ITEMS = {
     # Common Animals (40% total)
@@ -440,13 +1435,24 @@ LEVEL_RANKS = {
     "Master": {"threshold": 75, "emoji": "🏅", "perks": "+40% XP gain, Elite hunter status"},
     "Legendary": {"threshold": 100, "emoji": "🌟", "perks": "+50% XP gain, Maximum hunt potential"}
 }
+LEVEL_RANK_ORDER = sorted(LEVEL_RANKS, key=lambda name: LEVEL_RANKS[name]["threshold"])
+LEVEL_RANK_THRESHOLDS = [LEVEL_RANKS[name]["threshold"] for name in LEVEL_RANK_ORDER]
+
+def get_level_rank(level):
+    """Level-based rank name for a level"""
+    return LEVEL_RANK_ORDER[max(bisect_right(LEVEL_RANK_THRESHOLDS, level) - 1, 0)]
 
 # Utility functions
 async def get_user_data(user_id):
-    user = users.find_one({"_id": user_id})
+    user = user_cache.get(user_id)
+    if user is not None:
+        return dict(user)
+
+    user = await users_db.find_one({"_id": user_id})
     if not user:
-        user = {
-            "_id": user_id,
+        # Upsert rather than insert: two first commands from a new user can both
+        # miss above, and a plain insert_one would fail the second on the unique _id
+        defaults = {
             "balance": STARTING_BALANCE,
             "daily_streak": 0,
             "last_daily": None,
@@ -465,11 +1471,318 @@ async def get_user_data(user_id):
             "title": "Newbie",
             "custom_rank": None
         }
-        users.insert_one(user)
-    return user
+        user = await users_db.find_one_and_update({"_id": user_id}, {"$setOnInsert": defaults}, upsert=True)
+        leaderboards.record(user_id, user)
+
+    # A write-through from change_balance/update_user_data may have landed while
+    # we were awaiting; that copy is newer than ours, so keep it
+    cached = user_cache.peek(user_id)
+    if cached is not None:
+        return dict(cached)
+    user_cache.set(user_id, user)
+    return dict(user)
 
 async def update_user_data(user_id, update):
-    users.update_one({"_id": user_id}, {"$set": update})
+    await users_db.update_one({"_id": user_id}, {"$set": update})
+    leaderboards.record(user_id, update)
+
+    # Write through to the cached copy; dotted paths are simpler to just refetch
+    cached = user_cache.peek(user_id)
+    if cached is not None:
+        if any("." in field for field in update):
+            user_cache.pop(user_id)
+        else:
+            cached.update(update)
+
+# Bot ban list
+# Kept in memory so the per-message ban check never touches the database.
+# banuser/unbanuser update it directly; the periodic refresh picks up bans
+# written by other bot processes.
+BAN_REFRESH_SECONDS = int(os.getenv("BAN_REFRESH_SECONDS", "300"))
+banned_user_ids = set()
+# user_id -> banned for bans/unbans made while a reload is reading the collection;
+# None when no reload is running
+ban_changes_during_load = None
+
+async def load_banned_users():
+    """Reload the ban set from the users collection"""
+    global banned_user_ids, ban_changes_during_load
+    ban_changes_during_load = changes = {}
+    try:
+        banned = await users_db.find({"bot_banned": True}, projection={"bot_banned": 1})
+    finally:
+        ban_changes_during_load = None
+    loaded = {doc["_id"] for doc in banned if doc.get("bot_banned")}
+    # The find may have started before these, so they win over what it returned
+    for user_id, is_banned in changes.items():
+        if is_banned:
+            loaded.add(user_id)
+        else:
+            loaded.discard(user_id)
+    banned_user_ids = loaded
+    print(f"Loaded {len(banned_user_ids)} bot bans")
+
+async def set_bot_banned(user_id, banned):
+    """Store a ban or unban and apply it to the in-memory ban set"""
+    await update_user_data(user_id, {"bot_banned": banned})
+    if banned:
+        banned_user_ids.add(user_id)
+    else:
+        banned_user_ids.discard(user_id)
+    if ban_changes_during_load is not None:
+        ban_changes_during_load[user_id] = banned
+
+def is_bot_banned(user_id):
+    """Check the in-memory ban set (the owner can never be banned)"""
+    return user_id in banned_user_ids and user_id != OWNER_ID
+
+@tasks.loop(seconds=BAN_REFRESH_SECONDS)
+async def refresh_banned_users():
+    try:
+        await load_banned_users()
+    except Exception as e:
+        print(f"Failed to refresh ban list: {e}")
+
+@refresh_banned_users.before_loop
+async def before_refresh_banned_users():
+    # setup_hook already did the initial load
+    await asyncio.sleep(BAN_REFRESH_SECONDS)
+
+# Cooldowns
+# Cooldown start times live in an expiring hash keyed by (command, user), so a
+# user spamming a command is turned away before any database read. Passing the
+# check reserves the cooldown there and then, so overlapping calls can't both get
+# through; commands release it if they bail out before doing anything. The
+# last_* fields on the user document stay the record across restarts and are
+# checked once the reservation is held. With REDIS_URL set the reservation is
+# mirrored (SET NX) to a Redis-compatible server shared by every shard/process.
+COMMAND_COOLDOWNS = {
+    "work": 3600,
+    "crime": 1800,
+    "hunt": 2,
+    "fish": 300,
+    "dig": 120,
+    "explore": 300,
+    "steal": 600,
+    "rob": 600,
+    "quest": 1200,
+    "coinflip": 7,
+    "daily": 86400,
+    "weekly": 7 * 86400,
+    "monthly": 30 * 86400,
+}
+COOLDOWN_SWEEP_SECONDS = int(os.getenv("COOLDOWN_SWEEP_SECONDS", "60"))
+REDIS_URL = os.getenv("REDIS_URL")
+
+class CooldownEngine:
+    """Expiring hash of cooldown start times with an optional Redis mirror"""
+
+    def __init__(self):
+        self.entries = {}  # (command, user_id) -> (started, expires) as timestamps
+        self.redis = None
+
+    async def connect(self, url):
+        """Share cooldowns through a Redis-compatible server"""
+        if aioredis is None:
+            print("REDIS_URL is set but the redis package is not installed, using in-process cooldowns")
+            return
+        try:
+            client = aioredis.from_url(url)
+            await client.ping()
+            self.redis = client
+            print("Cooldowns shared through Redis")
+        except Exception as e:
+            print(f"Failed to connect to Redis, using in-process cooldowns: {e}")
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    @staticmethod
+    def _remaining(started, seconds, now):
+        return max(0, seconds - int(now - started))
+
+    async def acquire(self, command, user_id, seconds=None):
+        """Reserve a command for a user, or return the whole seconds left on its cooldown
+
+        seconds can be shorter than the command's usual cooldown (energy drink)"""
+        if seconds is None:
+            seconds = COMMAND_COOLDOWNS[command]
+        key = (command, user_id)
+        now = datetime.datetime.now().timestamp()
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] > now:
+            remaining = self._remaining(entry[0], seconds, now)
+            if remaining:
+                return remaining
+        # Claimed before the first await, so concurrent calls here see it
+        self.entries[key] = (now, now + COMMAND_COOLDOWNS[command])
+        if self.redis is None:
+            return 0
+
+        name = f"cooldown:{command}:{user_id}"
+        ttl_ms = COMMAND_COOLDOWNS[command] * 1000
+        try:
+            if await self.redis.set(name, now, nx=True, px=ttl_ms):
+                return 0
+            value = await self.redis.get(name)
+            if value is not None:
+                started = float(value)
+                remaining = self._remaining(started, seconds, datetime.datetime.now().timestamp())
+                if remaining:
+                    self.entries[key] = (started, started + COMMAND_COOLDOWNS[command])
+                    return remaining
+            # Expired meanwhile, or only held past this caller's shorter cooldown
+            await self.redis.set(name, now, px=ttl_ms)
+        except Exception as e:
+            print(f"Redis cooldown reservation failed: {e}")
+        return 0
+
+    async def release(self, command, user_id):
+        """Give back a reservation for a call that bailed out before doing anything"""
+        held = held_cooldowns.get()
+        if held is not None and (command, user_id) in held:
+            held.remove((command, user_id))
+        self.entries.pop((command, user_id), None)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(f"cooldown:{command}:{user_id}")
+            except Exception as e:
+                print(f"Redis cooldown release failed: {e}")
+
+    async def start(self, command, user_id, started):
+        """Record a use the hash didn't know about, from a stored last_* time"""
+        started = started.timestamp()
+        expires = started + COMMAND_COOLDOWNS[command]
+        ttl = expires - datetime.datetime.now().timestamp()
+        if ttl <= 0:
+            return
+        self.entries[(command, user_id)] = (started, expires)
+        if self.redis is not None:
+            try:
+                await self.redis.set(f"cooldown:{command}:{user_id}", started, px=int(ttl * 1000))
+            except Exception as e:
+                print(f"Redis cooldown write failed: {e}")
+
+    def sweep(self):
+        """Drop expired entries so the hash only holds live cooldowns"""
+        now = datetime.datetime.now().timestamp()
+        expired = [key for key, (_, expires) in self.entries.items() if expires <= now]
+        for key in expired:
+            del self.entries[key]
+        return len(expired)
+
+cooldowns = CooldownEngine()
+
+# Reservations taken by the command invocation currently running, so one that
+# raises part way through can give them back (see releases_cooldown_on_error)
+held_cooldowns = ContextVar("held_cooldowns", default=None)
+
+def releases_cooldown_on_error(func):
+    """Release the cooldowns a command reserved if its body raises
+
+    Commands that did get to their reward write have stored last_<command>, so
+    check_cooldown still finds the cooldown in the user document afterwards"""
+    @wraps(func)
+    async def wrapper(ctx, *args, **kwargs):
+        token = held_cooldowns.set([])
+        try:
+            return await func(ctx, *args, **kwargs)
+        except BaseException:
+            for command, user_id in list(held_cooldowns.get()):
+                await cooldowns.release(command, user_id)
+            raise
+        finally:
+            held_cooldowns.reset(token)
+    return wrapper
+
+async def check_cooldown(command, user_id, seconds=None):
+    """Reserve a command cooldown, reading the user only once the reservation is held
+
+    Returns (remaining, user); user is None when the hash rejected the call. When
+    remaining is 0 the cooldown is already running, so a command that bails out
+    before doing anything must call cooldowns.release. Commands decorated with
+    releases_cooldown_on_error also get it back if they raise"""
+    remaining = await cooldowns.acquire(command, user_id, seconds)
+    if remaining:
+        return remaining, None
+
+    try:
+        user = await get_user_data(user_id)
+    except Exception:
+        await cooldowns.release(command, user_id)
+        raise
+    last_used = user.get(f"last_{command}")
+    if last_used:
+        # The document remembers a use the hash didn't, e.g. from before a restart
+        last_used = last_used.replace(tzinfo=None)
+        if seconds is None:
+            seconds = COMMAND_COOLDOWNS[command]
+        remaining = max(0, seconds - int((datetime.datetime.now() - last_used).total_seconds()))
+        if remaining:
+            await cooldowns.start(command, user_id, last_used)
+    held = held_cooldowns.get()
+    if held is not None and not remaining:
+        held.append((command, user_id))
+    return remaining, user
+
+@tasks.loop(seconds=COOLDOWN_SWEEP_SECONDS)
+async def sweep_cooldowns():
+    cooldowns.sweep()
+
+# Balance ledger
+# Balances only ever move through atomic $inc updates. Debits carry a
+# "balance >= stake" filter, so overlapping commands can't spend the same money twice.
+async def change_balance(user_id, amount, min_balance=None, extra=None):
+    """Atomically add amount (negative to debit) to a user's balance
+
+    Returns the updated user document, or None if min_balance wasn't met"""
+    await get_user_data(user_id)  # make sure the document exists
+    query = {"_id": user_id}
+    if min_balance is not None:
+        query["balance"] = {"$gte": min_balance}
+    update = {"$inc": {"balance": amount}}
+    if extra:
+        update["$set"] = extra
+
+    user = await users_db.find_one_and_update(query, update)
+    if user is None:
+        user_cache.pop(user_id)  # our copy was stale, refetch next time
+        return None
+    user_cache.set(user_id, user)
+    leaderboards.record(user_id, user)
+    return dict(user)
+
+async def deduct_balance(user_id, amount, extra=None):
+    """Take up to amount from a user without letting the balance go negative
+
+    Returns (amount_taken, updated_user)"""
+    for _ in range(3):
+        user = await get_user_data(user_id)
+        taken = min(amount, max(0, user["balance"]))
+        updated = await change_balance(user_id, -taken, min_balance=taken, extra=extra)
+        if updated is not None:
+            return taken, updated
+    return 0, await change_balance(user_id, 0, extra=extra)
+
+async def transfer_balance(from_id, to_id, amount, allow_partial=False, sender_extra=None, recipient_extra=None):
+    """Move money between two users as a conditional debit plus a credit
+
+    Returns (amount_moved, sender, recipient), or None if the sender can't cover it"""
+    if allow_partial:
+        amount, sender = await deduct_balance(from_id, amount, extra=sender_extra)
+    else:
+        sender = await change_balance(from_id, -amount, min_balance=amount, extra=sender_extra)
+        if sender is None:
+            return None
+
+    try:
+        recipient = await change_balance(to_id, amount, extra=recipient_extra)
+    except Exception:
+        # Compensate so a failed credit never destroys the debited money
+        await change_balance(from_id, amount)
+        raise
+    return amount, sender, recipient
 
 def get_wealth_rank(balance):
     """Calculate wealth rank based on balance"""
@@ -480,102 +1793,141 @@ def get_wealth_rank(balance):
             break
     return wealth_rank
 
-async def add_xp(user_id, amount):
-    """Add XP to user and check for level up"""
-    user = await get_user_data(user_id)
-    old_level = user.get("level", 1)
-    new_xp = user.get("xp", 0) + amount
-
-    # Calculate new level
-    new_level = 1
-    while calculate_xp_for_level(new_level) <= new_xp:
-        new_level += 1
-    new_level -= 1  # Go back one since we went over
-
-    # Update rank based on level
-    if new_level >= 100:
-        rank = "Legendary"
-    elif new_level >= 75:
-        rank = "Master"
-    elif new_level >= 50:
-        rank = "Expert"
-    elif new_level >= 25:
-        rank = "Advanced"
-    elif new_level >= 10:
-        rank = "Intermediate"
+# Rewards
+# Level and rank are derived from XP, so a reward is one update that $inc's the
+# balance and $set's the recomputed xp/level/rank plus any cooldown fields. The
+# write is guarded on the XP we computed from; if another command moved it first
+# we reread and recompute instead of overwriting their XP.
+async def grant_reward(user_id, amount=0, xp=0, extra=None):
+    """Atomically credit balance and XP, update level/rank and set extra fields
+
+    Returns (leveled_up, new_level, updated_user)"""
+    for _ in range(3):
+        user = await get_user_data(user_id)
+        old_level = user.get("level", 1)
+        old_xp = user.get("xp")
+        new_xp = (old_xp or 0) + xp
+        new_level = level_for_xp(new_xp)
+
+        fields = {"xp": new_xp, "level": new_level, "rank": get_level_rank(new_level)}
+        if extra:
+            fields.update(extra)
+        query = {"_id": user_id, "xp": old_xp if old_xp is not None else {"$exists": False}}
+        updated = await users_db.find_one_and_update(query, {"$inc": {"balance": amount}, "$set": fields})
+        if updated is not None:
+            break
+        user_cache.pop(user_id)  # XP moved under us, reread and recompute
     else:
-        rank = "Newbie"
-
-    await update_user_data(user_id, {"xp": new_xp, "level": new_level, "rank": rank})
-
-    # Send level up message if user leveled up
-    if new_level > old_level:
-        try:
-            user_obj = bot.get_user(user_id)
-            if user_obj:
-                # Find a channel to send the level up message
-                # This will need to be called from a context where we have access to a channel
-                pass
-        except:
-            pass
-
-    return new_level > old_level, new_level
+        # Still contended: never drop the reward, apply the deltas and fix the level after
+        update = {"$inc": {"balance": amount, "xp": xp}}
+        if extra:
+            update["$set"] = extra
+        updated = await users_db.find_one_and_update({"_id": user_id}, update)
+        new_level = level_for_xp(updated["xp"])
+        fields = {"level": new_level, "rank": get_level_rank(new_level)}
+        await users_db.update_one({"_id": user_id}, {"$set": fields})
+        updated.update(fields)
+
+    user_cache.set(user_id, updated)
+    leaderboards.record(user_id, updated)
+    return new_level > old_level, new_level, dict(updated)
+
+async def update_inventory(user_id, deltas, current=None):
+    """Apply a whole map of item count changes in a single write"""
+    deltas = {name: amount for name, amount in deltas.items() if amount}
+    if not deltas:
+        return await inventories_db.find_one({"_id": user_id})
+
+    query = {"_id": user_id}
+    inc = {}
+    unset = {}
+    for name, amount in deltas.items():
+        field = f"items.{name}"
+        if current is not None and current.get(name, 0) + amount == 0:
+            # Emptied stacks are dropped in the same write; the exact-count
+            # filter makes this safe against a concurrent change
+            query[field] = current[name]
+            unset[field] = ""
+        else:
+            if amount < 0:
+                query[field] = {"$gte": -amount}
+            inc[field] = amount
+
+    update = {}
+    if inc:
+        update["$inc"] = inc
+    if unset:
+        update["$unset"] = unset
+
+    # Only pure additions may create the inventory; a guarded removal that
+    # misses must fail instead of inserting a duplicate _id
+    upsert = all(amount > 0 for amount in deltas.values())
+    inventory = await inventories_db.find_one_and_update(query, update, upsert=upsert)
+    if inventory is None:
+        return None
+
+    # Callers that didn't know the old counts get zero stacks cleaned up here
+    items = inventory.get("items", {})
+    emptied = {f"items.{name}": 0 for name in deltas
+               if f"items.{name}" in inc and items.get(name, 1) <= 0}
+    if emptied:
+        await inventories_db.update_one({"_id": user_id, **emptied},
+                                        {"$unset": {field: "" for field in emptied}})
+        for field in emptied:
+            items.pop(field.split(".", 1)[1], None)
+    return inventory
 
 async def add_item(user_id, item_name, amount=1):
-    inventory = inventories.find_one({"_id": user_id})
-    if not inventory:
-        inventory = {"_id": user_id, "items": {}}
-        inventories.insert_one(inventory)
-
-    items = inventory.get("items", {})
-    items[item_name] = items.get(item_name, 0) + amount
-    inventories.update_one({"_id": user_id}, {"$set": {"items": items}})
+    await update_inventory(user_id, {item_name: amount})
 
 async def remove_item(user_id, item_name, amount=1):
-    inventory = inventories.find_one({"_id": user_id})
-    if inventory:
-        items = inventory.get("items", {})
-        if item_name in items and items[item_name] >= amount:
-            items[item_name] -= amount
-            if items[item_name] <= 0:
-                del items[item_name]
-            inventories.update_one({"_id": user_id}, {"$set": {"items": items}})
-            return True
-    return False
+    return await update_inventory(user_id, {item_name: -amount}) is not None
+
+# Embed templates
+# The frame, footer and colour divider only depend on (title, colour), so they
+# are built once per combination and each call clones the cached base embed.
+EMBED_FOOTER_TEXT = "╰─── 🌟 Advanced OwO Bot • Superior Experience ───╯"
+EMBED_FOOTER_ICON = "https://cdn.discordapp.com/emojis/878328329692819466.gif"
+EMBED_DIVIDERS = {
+    discord.Color.gold(): "⭐ ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━ ⭐",
+    discord.Color.green(): "💚 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━ 💚",
+    discord.Color.red(): "❤️ ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━ ❤️",
+}
+embed_templates = LRUCache(1024)
+
+def _build_embed_template(title, color):
+    embed = discord.Embed(title=f"╭─── ✨ {title} ✨ ───╮", color=color)
+    embed.set_footer(text=EMBED_FOOTER_TEXT, icon_url=EMBED_FOOTER_ICON)
+    divider = EMBED_DIVIDERS.get(color)
+    if divider:
+        embed.add_field(name="", value=divider, inline=False)
+    # Only the slots that are actually set, so cloning never probes empty ones
+    return [(slot, getattr(embed, slot)) for slot in discord.Embed.__slots__ if hasattr(embed, slot)]
+
+def _clone_embed(template):
+    """Build an embed from a template's slot values (Embed.copy round-trips through to_dict)"""
+    embed = discord.Embed.__new__(discord.Embed)
+    for slot, value in template:
+        if slot == "_fields":
+            # add_field/set_field_at mutate the field list in place; every
+            # other setter replaces its value, so only fields need a copy
+            value = [dict(field) for field in value]
+        setattr(embed, slot, value)
+    return embed
 
 def create_aesthetic_embed(title, description="", color=discord.Color.purple(), thumbnail_url=None):
     """Create beautiful aesthetic embeds with advanced styling"""
-    # Add decorative borders and styling
-    styled_title = f"╭─── ✨ {title} ✨ ───╮"
-    if description:
-        styled_description = f"│ {description} │"
-    else:
-        styled_description = ""
-
-    embed = discord.Embed(
-        title=styled_title,
-        description=styled_description,
-        color=color,
-        timestamp=datetime.datetime.now()
-    )
-
-    # Add aesthetic elements
-    embed.set_footer(
-        text="╰─── 🌟 Advanced OwO Bot • Superior Experience ───╯",
-        icon_url="https://cdn.discordapp.com/emojis/878328329692819466.gif"
-    )
-
+    key = (title, color)
+    template = embed_templates.get(key)
+    if template is None:
+        template = _build_embed_template(title, color)
+        embed_templates.set(key, template)
+
+    embed = _clone_embed(template)
+    embed.description = f"│ {description} │" if description else ""
+    embed.timestamp = datetime.datetime.now()
     if thumbnail_url:
         embed.set_thumbnail(url=thumbnail_url)
-
-    # Add subtle gradient effect with color variations
-    if color == discord.Color.gold():
-        embed.add_field(name="", value="⭐ ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━ ⭐", inline=False)
-    elif color == discord.Color.green():
-        embed.add_field(name="", value="💚 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━ 💚", inline=False)
-    elif color == discord.Color.red():
-        embed.add_field(name="", value="❤️ ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━ ❤️", inline=False)
-
     return embed
 
 # Owner Commands
@@ -641,7 +1993,7 @@ async def banuser(ctx, member: discord.Member):
                                      discord.Color.red())
         return await ctx.send(embed=embed)
 
-    await update_user_data(member.id, {"bot_banned": True})
+    await set_bot_banned(member.id, True)
 
     embed = create_aesthetic_embed("🔨 User Banned",
                                  f"║ **{member.display_name}** has been banned from using the bot! ║",
@@ -658,7 +2010,7 @@ async def unbanuser(ctx, member: discord.Member):
                                      discord.Color.red())
         return await ctx.send(embed=embed)
 
-    await update_user_data(member.id, {"bot_banned": False})
+    await set_bot_banned(member.id, False)
 
     embed = create_aesthetic_embed("✅ User Unbanned",
                                  f"║ **{member.display_name}** can now use the bot again! ║",
@@ -708,21 +2060,8 @@ async def setlevel(ctx, member: discord.Member, level: int):
         return await ctx.send(embed=embed)
 
     # Calculate XP for the given level
-    required_xp = sum(calculate_xp_for_level(i) for i in range(1, level + 1))
-
-    # Update rank based on level
-    if level >= 100:
-        rank = "Legendary"
-    elif level >= 75:
-        rank = "Master"
-    elif level >= 50:
-        rank = "Expert"
-    elif level >= 25:
-        rank = "Advanced"
-    elif level >= 10:
-        rank = "Intermediate"
-    else:
-        rank = "Newbie"
+    required_xp = total_xp_for_level(level)
+    rank = get_level_rank(level)
 
     await update_user_data(member.id, {
         "level": level,
@@ -798,10 +2137,10 @@ async def setanimals(ctx, member: discord.Member, animal_name: str, quantity: in
         return await ctx.send(embed=embed)
 
     # Get current inventory
-    inventory = inventories.find_one({"_id": member.id})
+    inventory = await inventories_db.find_one({"_id": member.id})
     if not inventory:
         inventory = {"_id": member.id, "items": {}}
-        inventories.insert_one(inventory)
+        await inventories_db.insert_one(inventory)
 
     items = inventory.get("items", {})
     old_quantity = items.get(found_animal, 0)
@@ -814,7 +2153,7 @@ async def setanimals(ctx, member: discord.Member, animal_name: str, quantity: in
     else:
         items[found_animal] = quantity
 
-    inventories.update_one({"_id": member.id}, {"$set": {"items": items}})
+    await inventories_db.update_one({"_id": member.id}, {"$set": {"items": items}})
 
     # Calculate total value
     total_value = animal_data["value"] * quantity
@@ -857,28 +2196,45 @@ async def setanimals(ctx, member: discord.Member, animal_name: str, quantity: in
 
 
 # AI-Powered Mention Handler
+# Reply detection
+# Discord usually sends the replied-to message along with the reply, so the
+# REST fetch is only needed when neither that nor our own cache knows the author.
+recent_bot_messages = LRUCache(5000)
+
+async def replies_to_bot(message):
+    """Check whether a message is a reply to one of the bot's messages"""
+    reference = message.reference
+    if reference is None or reference.message_id is None:
+        return False
+
+    replied = reference.resolved or reference.cached_message
+    if isinstance(replied, discord.Message):
+        return replied.author == bot.user
+    if isinstance(replied, discord.DeletedReferencedMessage):
+        return False
+    if recent_bot_messages.get(reference.message_id):
+        return True
+
+    try:
+        replied = await message.channel.fetch_message(reference.message_id)
+    except Exception:
+        return False
+    return replied.author == bot.user
+
 @bot.event
 async def on_message(message):
     if message.author == bot.user:
+        recent_bot_messages.set(message.id, True)
         return
 
     # Check if user is banned from using the bot
-    if not message.author.bot:
-        user_data = await get_user_data(message.author.id)
-        if user_data.get("bot_banned", False) and message.author.id != OWNER_ID:
-            return  # Silently ignore banned users
+    if is_bot_banned(message.author.id):
+        return  # Silently ignore banned users
 
     # Check if bot is mentioned or message is a reply to the bot
     is_mention = bot.user.mentioned_in(message) and not message.mention_everyone
-    is_reply_to_bot = False
-    
-    if message.reference:
-        try:
-            replied_message = await message.channel.fetch_message(message.reference.message_id)
-            is_reply_to_bot = replied_message.author == bot.user
-        except:
-            pass
-    
+    is_reply_to_bot = not is_mention and await replies_to_bot(message)
+
     if is_mention or is_reply_to_bot:
         # Clean message content (remove mention and clean up)
         clean_content = message.content.replace(f'<@{bot.user.id}>', '').replace(f'<@!{bot.user.id}>', '').strip()
@@ -890,6 +2246,18 @@ async def on_message(message):
                 clean_content = clean_content[len(prefix):].strip()
                 break
 
+        # Long AI answers are posted as soon as the first chunk arrives and
+        # then edited in place while the rest streams in
+        streamed = {"reply": None, "text": None}
+
+        async def show_partial(text):
+            text = text[:2000]
+            if streamed["reply"] is None:
+                streamed["reply"] = await message.reply(text)
+            else:
+                await streamed["reply"].edit(content=text)
+            streamed["text"] = text
+
         # Show typing indicator for better UX
         async with message.channel.typing():
             if not clean_content:  # Handle empty mentions
@@ -898,11 +2266,16 @@ async def on_message(message):
                 else:
                     response = "Hey! I'm OwO Bot with economy, games, and social features! Use `owo help` to see all my commands! 👋🤖"
             else:
-                # Generate simple response
-                response = get_simple_bot_response(clean_content)
+                # Generate response (awaits the AI without blocking other events)
+                response = await get_bot_response(clean_content, show_partial, message.author.id,
+                                                  message.guild.id if message.guild else None)
 
         try:
-            await message.reply(response)
+            response = response[:2000]
+            if streamed["reply"] is None:
+                await message.reply(response)
+            elif streamed["text"] != response:
+                await streamed["reply"].edit(content=response)
         except Exception as e:
             print(f"❌ Error sending response: {e}")
             try:
@@ -976,38 +2349,35 @@ async def balance(ctx, member: discord.Member = None):
     await ctx.send(embed=embed)
 
 @bot.command(aliases=['cowoncy'])
+@releases_cooldown_on_error
 async def daily(ctx):
     """Claim your daily coins"""
-    user = await get_user_data(ctx.author.id)
     now = datetime.datetime.now()
 
-    if user["last_daily"]:
-        last_daily = user["last_daily"].replace(tzinfo=None)
-        if (now - last_daily).days < 1:
-            next_daily = (last_daily + datetime.timedelta(days=1)).strftime("%H:%M %p")
-            embed = create_aesthetic_embed("⏰ Already Claimed",
-                                         f"You already claimed your daily today!\n"
-                                         f"Come back at **{next_daily}**",
-                                         discord.Color.orange())
-            return await ctx.send(embed=embed)
+    remaining, user = await check_cooldown("daily", ctx.author.id)
+    if remaining:
+        next_daily = (now + datetime.timedelta(seconds=remaining)).strftime("%H:%M %p")
+        embed = create_aesthetic_embed("⏰ Already Claimed",
+                                     f"You already claimed your daily today!\n"
+                                     f"Come back at **{next_daily}**",
+                                     discord.Color.orange())
+        return await ctx.send(embed=embed)
 
     streak = user["daily_streak"] + 1
     level = user.get("level", 1)
     base_amount = calculate_daily_bonus(level) + (streak * 50)
 
     # Apply shop multipliers
-    daily_multiplier = await get_active_multiplier(ctx.author.id, "daily")
+    effects = await get_effect_snapshot(ctx.author.id, user)
+    daily_multiplier = effects.multiplier("daily")
     total_amount = int(base_amount * daily_multiplier)
 
     # Apply XP booster if active
     xp_gain = 50
-    if await has_active_effect(ctx.author.id, "xp_booster"):
+    if effects.has("xp_booster"):
         xp_gain *= 2
 
-    leveled_up, new_level = await add_xp(ctx.author.id, xp_gain)
-
-    await update_user_data(ctx.author.id, {
-        "balance": user["balance"] + total_amount,
+    leveled_up, new_level, _ = await grant_reward(ctx.author.id, total_amount, xp_gain, extra={
         "daily_streak": streak,
         "last_daily": now
     })
@@ -1026,7 +2396,7 @@ async def daily(ctx):
     if daily_multiplier > 1.0:
         description += f"\n🛍️ Shop Multiplier: **x{daily_multiplier}** ✨"
 
-    if await has_active_effect(ctx.author.id, "xp_booster"):
+    if effects.has("xp_booster"):
         description += f"\n🚀 XP Boost: **+{xp_gain}** XP (Double XP active!)"
 
     if leveled_up:
@@ -1045,18 +2415,33 @@ async def daily(ctx):
         await ctx.send(embed=congrats_embed)
 
 @bot.command()
+@releases_cooldown_on_error
 async def work(ctx):
     """Work to earn money"""
-    user = await get_user_data(ctx.author.id)
     now = datetime.datetime.now()
 
-    # Check for energy drink effect (reduces cooldown by 50%)
-    cooldown_time = 3600  # 1 hour default
-    if await has_active_effect(ctx.author.id, "energy_drink"):
-        cooldown_time = int(cooldown_time * 0.5)  # 30 minutes with energy drink
-
-    if user["last_work"] and (now - user["last_work"].replace(tzinfo=None)).seconds < cooldown_time:
-        remaining = cooldown_time - (now - user["last_work"].replace(tzinfo=None)).seconds
+    cooldown_time = COMMAND_COOLDOWNS["work"]  # 1 hour default
+    energy_cooldown = int(cooldown_time * 0.5)  # 30 minutes with energy drink
+
+    # Nobody can work again sooner than the energy drink cooldown, so spam is
+    # rejected on that before the user document is read
+    remaining, user = await check_cooldown("work", ctx.author.id, energy_cooldown)
+
+    # Check for energy drink effect (reduces cooldown by 50%); a call the cooldown
+    # hash already rejected still needs the user's effects to word its reply, and
+    # get_user_data serves those from the cache when it can
+    effects = await get_effect_snapshot(ctx.author.id, user)
+    if effects.has("energy_drink"):
+        cooldown_time = energy_cooldown
+    elif remaining:
+        remaining += cooldown_time - energy_cooldown  # same start, full length cooldown
+    elif user.get("last_work"):
+        last_work = user["last_work"].replace(tzinfo=None)
+        remaining = max(0, cooldown_time - int((now - last_work).total_seconds()))
+        if remaining:
+            await cooldowns.start("work", ctx.author.id, last_work)
+
+    if remaining:
         cooldown_text = "⚡ Energy Drink active!" if cooldown_time < 3600 else "Normal cooldown"
 
         embed = create_aesthetic_embed("😴 Too Tired",
@@ -1072,7 +2457,7 @@ async def work(ctx):
     level_bonus = calculate_level_bonus(level)
 
     # Apply work multiplier from shop
-    work_multiplier = await get_active_multiplier(ctx.author.id, "work")
+    work_multiplier = effects.multiplier("work")
     total_amount = int((base_amount + level_bonus) * work_multiplier)
 
     jobs = ["🖥️ Programmer", "⚕️ Doctor", "📚 Teacher", "📺 Streamer",
@@ -1082,15 +2467,10 @@ async def work(ctx):
 
     # Apply XP booster if active
     xp_gain = 30
-    if await has_active_effect(ctx.author.id, "xp_booster"):
+    if effects.has("xp_booster"):
         xp_gain *= 2
 
-    leveled_up, new_level = await add_xp(ctx.author.id, xp_gain)
-
-    await update_user_data(ctx.author.id, {
-        "balance": user["balance"] + total_amount,
-        "last_work": now
-    })
+    leveled_up, new_level, _ = await grant_reward(ctx.author.id, total_amount, xp_gain, extra={"last_work": now})
 
     description = f"You worked as a **{job}**\n"
     description += f"💰 Base Pay: **{base_amount:,}** 💵\n"
@@ -1101,10 +2481,10 @@ async def work(ctx):
 
     description += f"💎 Total Earned: **{total_amount:,}** 💵"
 
-    if await has_active_effect(ctx.author.id, "energy_drink"):
+    if effects.has("energy_drink"):
         description += f"\n⚡ Energy Drink: Reduced cooldown!"
 
-    if await has_active_effect(ctx.author.id, "xp_booster"):
+    if effects.has("xp_booster"):
         description += f"\n🚀 XP Boost: **+{xp_gain}** XP (Double XP active!)"
 
     if leveled_up:
@@ -1122,183 +2502,104 @@ async def work(ctx):
                                                discord.Color.gold())
         await ctx.send(embed=congrats_embed)
 
-# Enhanced Social commands with anime GIFs and advanced aesthetics
-@bot.command()
-async def hug(ctx, member: discord.Member):
-    """Hug another user with anime GIF"""
-    gif_url = await get_anime_gif("hug")
-
-    embed = create_aesthetic_embed("💕 Warm Hug",
-                                 f"**{ctx.author.display_name}** gives **{member.display_name}** a warm, loving hug! 🤗",
-                                 discord.Color.from_rgb(255, 182, 193))
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def kiss(ctx, member: discord.Member):
-    """Kiss another user with anime GIF"""
-    gif_url = await get_anime_gif("kiss")
-
-    embed = create_aesthetic_embed("💋 Sweet Kiss",
-                                 f"**{ctx.author.display_name}** gives **{member.display_name}** a tender kiss! 😘",
-                                 discord.Color.from_rgb(255, 20, 147))
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def slap(ctx, member: discord.Member):
-    """Slap another user with anime GIF"""
-    gif_url = await get_anime_gif("slap")
-
-    embed = create_aesthetic_embed("👋 Anime Slap",
-                                 f"**{ctx.author.display_name}** gives **{member.display_name}** a dramatic anime slap! 💥",
-                                 discord.Color.from_rgb(255, 140, 0))
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def punch(ctx, member: discord.Member):
-    """Punch another user with anime GIF"""
-    gif_url = await get_anime_gif("punch")
-
-    embed = create_aesthetic_embed("👊 Power Punch",
-                                 f"**{ctx.author.display_name}** throws an epic punch at **{member.display_name}**! ⚡",
-                                 discord.Color.from_rgb(220, 20, 60))
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def cuddle(ctx, member: discord.Member):
-    """Cuddle with another user with anime GIF"""
-    gif_url = await get_anime_gif("cuddle")
-
-    embed = create_aesthetic_embed("🥰 Sweet Cuddle",
-                                 f"**{ctx.author.display_name}** and **{member.display_name}** share a cozy cuddle! 💕",
-                                 discord.Color.from_rgb(255, 192, 203))
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def pat(ctx, member: discord.Member):
-    """Pat another user with anime GIF"""
-    gif_url = await get_anime_gif("pat")
-
-    embed = create_aesthetic_embed("😊 Gentle Pat",
-                                 f"**{ctx.author.display_name}** gives **{member.display_name}** gentle head pats! 🌟",
-                                 discord.Color.from_rgb(144, 238, 144))
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def poke(ctx, member: discord.Member):
-    """Poke another user with anime GIF"""
-    gif_url = await get_anime_gif("poke")
-
-    embed = create_aesthetic_embed("👉 Playful Poke",
-                                 f"**{ctx.author.display_name}** playfully pokes **{member.display_name}**! 😆",
-                                 discord.Color.from_rgb(135, 206, 250))
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def bite(ctx, member: discord.Member):
-    """Bite another user with anime GIF"""
-    gif_url = await get_anime_gif("bite")
-
-    embed = create_aesthetic_embed("🦷 Cute Bite",
-                                 f"**{ctx.author.display_name}** gives **{member.display_name}** an adorable little bite! 😸",
-                                 discord.Color.from_rgb(138, 43, 226))
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def tickle(ctx, member: discord.Member):
-    """Tickle another user with anime GIF"""
-    gif_url = await get_anime_gif("tickle")
-
-    embed = create_aesthetic_embed("😂 Tickle Attack",
-                                 f"**{ctx.author.display_name}** tickles **{member.display_name}**! 🤣",
-                                 discord.Color.from_rgb(255, 255, 0))
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def fuck(ctx, member: discord.Member):
-    """Adult action with another user with anime GIF"""
-    gif_url = await get_anime_gif("anime nsfw")
-
-    embed = create_aesthetic_embed("🔞 Adult Action",
-                                 f"**{ctx.author.display_name}** and **{member.display_name}** are having an intimate moment! 😳",
-                                 discord.Color.from_rgb(255, 69, 0))
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def kick(ctx, member: discord.Member):
-    """Kick another user with anime GIF"""
-    gif_url = await get_anime_gif("anime kick")
-
-    embed = create_aesthetic_embed("🦵 Martial Arts Kick",
-                                 f"**{ctx.author.display_name}** delivers a powerful kick to **{member.display_name}**! ⚡",
-                                 discord.Color.from_rgb(255, 140, 0))
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
+# Social action commands
+# Every hug/kiss/wave style command is generated from this table. "target" is the
+# text when a member is given, "solo" when nobody is; actions with both accept an
+# optional member. "gif" names the Tenor pool to pull an image from.
+SOCIAL_ACTIONS = [
+    {"name": "hug", "gif": "hug", "help": "Hug another user with anime GIF", "title": "💕 Warm Hug",
+     "color": discord.Color.from_rgb(255, 182, 193),
+     "target": "**{author}** gives **{target}** a warm, loving hug! 🤗"},
+    {"name": "kiss", "gif": "kiss", "help": "Kiss another user with anime GIF", "title": "💋 Sweet Kiss",
+     "color": discord.Color.from_rgb(255, 20, 147),
+     "target": "**{author}** gives **{target}** a tender kiss! 😘"},
+    {"name": "slap", "gif": "slap", "help": "Slap another user with anime GIF", "title": "👋 Anime Slap",
+     "color": discord.Color.from_rgb(255, 140, 0),
+     "target": "**{author}** gives **{target}** a dramatic anime slap! 💥"},
+    {"name": "punch", "gif": "punch", "help": "Punch another user with anime GIF", "title": "👊 Power Punch",
+     "color": discord.Color.from_rgb(220, 20, 60),
+     "target": "**{author}** throws an epic punch at **{target}**! ⚡"},
+    {"name": "cuddle", "gif": "cuddle", "help": "Cuddle with another user with anime GIF", "title": "🥰 Sweet Cuddle",
+     "color": discord.Color.from_rgb(255, 192, 203),
+     "target": "**{author}** and **{target}** share a cozy cuddle! 💕"},
+    {"name": "pat", "gif": "pat", "help": "Pat another user with anime GIF", "title": "😊 Gentle Pat",
+     "color": discord.Color.from_rgb(144, 238, 144),
+     "target": "**{author}** gives **{target}** gentle head pats! 🌟"},
+    {"name": "poke", "gif": "poke", "help": "Poke another user with anime GIF", "title": "👉 Playful Poke",
+     "color": discord.Color.from_rgb(135, 206, 250),
+     "target": "**{author}** playfully pokes **{target}**! 😆"},
+    {"name": "bite", "gif": "bite", "help": "Bite another user with anime GIF", "title": "🦷 Cute Bite",
+     "color": discord.Color.from_rgb(138, 43, 226),
+     "target": "**{author}** gives **{target}** an adorable little bite! 😸"},
+    {"name": "tickle", "gif": "tickle", "help": "Tickle another user with anime GIF", "title": "😂 Tickle Attack",
+     "color": discord.Color.from_rgb(255, 255, 0),
+     "target": "**{author}** tickles **{target}**! 🤣"},
+    {"name": "fuck", "gif": "anime nsfw", "help": "Adult action with another user with anime GIF", "title": "🔞 Adult Action",
+     "color": discord.Color.from_rgb(255, 69, 0),
+     "target": "**{author}** and **{target}** are having an intimate moment! 😳"},
+    {"name": "kick", "gif": "anime kick", "help": "Kick another user with anime GIF", "title": "🦵 Martial Arts Kick",
+     "color": discord.Color.from_rgb(255, 140, 0),
+     "target": "**{author}** delivers a powerful kick to **{target}**! ⚡"},
+
+    # Emotes
+    {"name": "blush", "gif": "blush", "help": "Blush with anime GIF", "title": "😊 Blush",
+     "color": discord.Color.pink(), "solo": "**{author}** is blushing adorably!"},
+    {"name": "cry", "gif": "cry", "help": "Cry with anime GIF", "title": "😭 Cry",
+     "color": discord.Color.blue(), "solo": "**{author}** is crying dramatically!"},
+    {"name": "dance", "gif": "dance", "help": "Dance with anime GIF", "title": "💃 Dance",
+     "color": discord.Color.gold(), "solo": "**{author}** is dancing with style!"},
+    {"name": "happy", "gif": "happy", "help": "Be happy with anime GIF", "title": "😄 Happy",
+     "color": discord.Color.yellow(), "solo": "**{author}** is radiating happiness!"},
+    {"name": "pout", "gif": "pout", "help": "Pout with anime GIF", "title": "😤 Pout",
+     "color": discord.Color.orange(), "solo": "**{author}** is pouting cutely!"},
+
+    # Text-only actions
+    {"name": "wave", "help": "Wave at someone", "title": "👋 Wave", "color": discord.Color.blue(),
+     "target": "║ **{author}** waves at **{target}**! ║", "solo": "║ **{author}** waves at everyone! ║"},
+    {"name": "boop", "help": "Boop someone's nose", "title": "👉 Boop", "color": discord.Color.pink(),
+     "target": "║ **{author}** boops **{target}**'s nose! ║"},
+    {"name": "snuggle", "help": "Snuggle with someone", "title": "🤗 Snuggle", "color": discord.Color.pink(),
+     "target": "║ **{author}** snuggles with **{target}**! ║"},
+    {"name": "handhold", "help": "Hold hands with someone", "title": "🤝 Hand Hold", "color": discord.Color.pink(),
+     "target": "║ **{author}** holds hands with **{target}**! ║"},
+    {"name": "greet", "help": "Greet someone", "title": "👋 Greeting", "color": discord.Color.green(),
+     "target": "║ **{author}** greets **{target}**! ║", "solo": "║ **{author}** greets everyone! ║"},
+    {"name": "bully", "help": "Playfully bully someone", "title": "😈 Bully", "color": discord.Color.orange(),
+     "target": "║ **{author}** playfully bullies **{target}**! ║"},
+    {"name": "protect", "help": "Protect someone", "title": "🛡️ Protect", "color": discord.Color.blue(),
+     "target": "║ **{author}** protects **{target}**! ║"},
+    {"name": "feed", "help": "Feed someone", "title": "🍽️ Feed", "color": discord.Color.yellow(),
+     "target": "║ **{author}** feeds **{target}**! ║"},
+]
 
-# Enhanced emote commands with anime GIFs
-@bot.command()
-async def blush(ctx):
-    """Blush with anime GIF"""
-    gif_url = await get_anime_gif("blush")
-
-    embed = create_aesthetic_embed("😊 Blush",
-                                 f"**{ctx.author.display_name}** is blushing adorably!",
-                                 discord.Color.pink())
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
+async def send_social_action(ctx, action, member=None):
+    """Shared handler behind every generated social command"""
+    if member is None:
+        description = action["solo"].format(author=ctx.author.display_name)
+    else:
+        description = action["target"].format(author=ctx.author.display_name, target=member.display_name)
 
-@bot.command()
-async def cry(ctx):
-    """Cry with anime GIF"""
-    gif_url = await get_anime_gif("cry")
-
-    embed = create_aesthetic_embed("😭 Cry",
-                                 f"**{ctx.author.display_name}** is crying dramatically!",
-                                 discord.Color.blue())
-    embed.set_image(url=gif_url)
+    embed = create_aesthetic_embed(action["title"], description, action["color"])
+    if "gif" in action:
+        embed.set_image(url=await get_anime_gif(action["gif"]))
     await ctx.send(embed=embed)
 
-@bot.command()
-async def dance(ctx):
-    """Dance with anime GIF"""
-    gif_url = await get_anime_gif("dance")
-
-    embed = create_aesthetic_embed("💃 Dance",
-                                 f"**{ctx.author.display_name}** is dancing with style!",
-                                 discord.Color.gold())
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
+def register_social_action(action):
+    """Register one SOCIAL_ACTIONS entry as a bot command"""
+    if "solo" not in action:
+        async def social_command(ctx, member: discord.Member):
+            await send_social_action(ctx, action, member)
+    elif "target" not in action:
+        async def social_command(ctx):
+            await send_social_action(ctx, action)
+    else:
+        async def social_command(ctx, member: discord.Member = None):
+            await send_social_action(ctx, action, member)
 
-@bot.command()
-async def happy(ctx):
-    """Be happy with anime GIF"""
-    gif_url = await get_anime_gif("happy")
-
-    embed = create_aesthetic_embed("😄 Happy",
-                                 f"**{ctx.author.display_name}** is radiating happiness!",
-                                 discord.Color.yellow())
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
+    bot.command(name=action["name"], help=action["help"])(social_command)
 
-@bot.command()
-async def pout(ctx):
-    """Pout with anime GIF"""
-    gif_url = await get_anime_gif("pout")
-
-    embed = create_aesthetic_embed("😤 Pout",
-                                 f"**{ctx.author.display_name}** is pouting cutely!",
-                                 discord.Color.orange())
-    embed.set_image(url=gif_url)
-    await ctx.send(embed=embed)
+for social_action in SOCIAL_ACTIONS:
+    register_social_action(social_action)
 
 # New commands to exceed 100 total
 
@@ -1308,19 +2609,18 @@ async def pout(ctx):
 @bot.command()
 async def leaderboard(ctx):
     """View server leaderboard"""
-    guild_members = [member.id for member in ctx.guild.members if not member.bot]
-    top_users = users.find({"_id": {"$in": guild_members}}).sort("balance", -1).limit(10)
+    top_users = leaderboards.top("balance", 10, guild=ctx.guild)
 
     embed = create_aesthetic_embed("🏆 Server Leaderboard", color=discord.Color.gold())
 
+    names = await resolve_display_names([user_data["_id"] for user_data in top_users], ctx.guild)
     ranking = []
     for i, user_data in enumerate(top_users, 1):
-        try:
-            user = await bot.fetch_user(user_data["_id"])
-            balance = user_data.get('balance', 0)
-            ranking.append(f"**{i}.** {user.display_name} - **{balance:,}** 💵")
-        except:
+        name = names.get(user_data["_id"])
+        if name is None:
             continue
+        balance = user_data.get('balance', 0)
+        ranking.append(f"**{i}.** {name} - **{balance:,}** 💵")
 
     embed.description = "\n".join(ranking) if ranking else "No users found!"
     await ctx.send(embed=embed)
@@ -1328,49 +2628,47 @@ async def leaderboard(ctx):
 # Additional commands to reach 100+ total commands
 
 @bot.command()
+@releases_cooldown_on_error
 async def weekly(ctx):
     """Claim weekly bonus"""
-    user = await get_user_data(ctx.author.id)
     now = datetime.datetime.now()
 
-    if user.get("last_weekly") and (now - user["last_weekly"].replace(tzinfo=None)).days < 7:
+    remaining, user = await check_cooldown("weekly", ctx.author.id)
+    if remaining:
         embed = create_aesthetic_embed("⏰ Weekly Cooldown", "║ Come back next week for your bonus! ║", discord.Color.orange())
         return await ctx.send(embed=embed)
 
     amount = 5000 + (user.get("level", 1) * 200)
-    new_balance = user["balance"] + amount
-
-    await update_user_data(ctx.author.id, {"balance": new_balance, "last_weekly": now})
+    await change_balance(ctx.author.id, amount, extra={"last_weekly": now})
 
     embed = create_aesthetic_embed("🗓️ Weekly Bonus", f"║ Claimed **{amount:,}** 💵 weekly bonus! ║", discord.Color.gold())
     await ctx.send(embed=embed)
 
 @bot.command()
+@releases_cooldown_on_error
 async def monthly(ctx):
     """Claim monthly mega bonus"""
-    user = await get_user_data(ctx.author.id)
     now = datetime.datetime.now()
 
-    if user.get("last_monthly") and (now - user["last_monthly"].replace(tzinfo=None)).days < 30:
+    remaining, user = await check_cooldown("monthly", ctx.author.id)
+    if remaining:
         embed = create_aesthetic_embed("📅 Monthly Cooldown", "║ Come back next month for mega bonus! ║", discord.Color.orange())
         return await ctx.send(embed=embed)
 
     amount = 50000 + (user.get("level", 1) * 1000)
-    new_balance = user["balance"] + amount
-
-    await update_user_data(ctx.author.id, {"balance": new_balance, "last_monthly": now})
+    await change_balance(ctx.author.id, amount, extra={"last_monthly": now})
 
     embed = create_aesthetic_embed("📅 Monthly Mega Bonus", f"║ Claimed **{amount:,}** 💵 monthly bonus! ║", discord.Color.gold())
     await ctx.send(embed=embed)
 
 @bot.command()
+@releases_cooldown_on_error
 async def dig(ctx):
     """Dig for treasure"""
-    user = await get_user_data(ctx.author.id)
     now = datetime.datetime.now()
 
-    if user.get("last_dig") and (now - user["last_dig"].replace(tzinfo=None)).seconds < 120:
-        remaining = 120 - (now - user["last_dig"].replace(tzinfo=None)).seconds
+    remaining, user = await check_cooldown("dig", ctx.author.id)
+    if remaining:
         embed = create_aesthetic_embed("⛏️ Tired Arms", f"║ Rest for **{remaining}** seconds before digging again! ║", discord.Color.orange())
         return await ctx.send(embed=embed)
 
@@ -1397,20 +2695,19 @@ async def dig(ctx):
     if not found_treasure:
         found_treasure = treasures[-1]  # Default to rock
 
-    new_balance = user["balance"] + found_treasure["value"]
-    await update_user_data(ctx.author.id, {"balance": new_balance, "last_dig": now})
+    await change_balance(ctx.author.id, found_treasure["value"], extra={"last_dig": now})
 
     embed = create_aesthetic_embed("⛏️ Treasure Hunt", f"║ Found {found_treasure['name']} worth **{found_treasure['value']:,}** 💵! ║", discord.Color.green())
     await ctx.send(embed=embed)
 
 @bot.command()
+@releases_cooldown_on_error
 async def explore(ctx):
     """Explore mysterious places"""
-    user = await get_user_data(ctx.author.id)
     now = datetime.datetime.now()
 
-    if user.get("last_explore") and (now - user["last_explore"].replace(tzinfo=None)).seconds < 300:
-        remaining = 300 - (now - user["last_explore"].replace(tzinfo=None)).seconds
+    remaining, user = await check_cooldown("explore", ctx.author.id)
+    if remaining:
         embed = create_aesthetic_embed("🗺️ Still Exploring", f"║ Continue exploring for **{remaining}** seconds! ║", discord.Color.orange())
         return await ctx.send(embed=embed)
 
@@ -1419,14 +2716,13 @@ async def explore(ctx):
 
     location = random.choice(locations)
     reward = random.choice(rewards)
-    new_balance = user["balance"] + reward
-
-    await update_user_data(ctx.author.id, {"balance": new_balance, "last_explore": now})
+    await change_balance(ctx.author.id, reward, extra={"last_explore": now})
 
     embed = create_aesthetic_embed("🗺️ Adventure", f"║ Explored {location} and found **{reward:,}** 💵! ║", discord.Color.blue())
     await ctx.send(embed=embed)
 
 @bot.command()
+@releases_cooldown_on_error
 async def steal(ctx, member: discord.Member):
     """Attempt to steal from another user"""
     if member == ctx.author:
@@ -1437,44 +2733,46 @@ async def steal(ctx, member: discord.Member):
         embed = create_aesthetic_embed("👑 Owner Protection", "║ You can't steal from the bot owner! ║", discord.Color.gold())
         return await ctx.send(embed=embed)
 
-    user = await get_user_data(ctx.author.id)
-    target = await get_user_data(member.id)
     now = datetime.datetime.now()
 
-    if user.get("last_steal") and (now - user["last_steal"].replace(tzinfo=None)).seconds < 600:
-        remaining = 600 - (now - user["last_steal"].replace(tzinfo=None)).seconds
+    remaining, user = await check_cooldown("steal", ctx.author.id)
+    if remaining:
         embed = create_aesthetic_embed("🕵️ Laying Low", f"║ Wait **{remaining}** seconds before attempting another theft! ║", discord.Color.orange())
         return await ctx.send(embed=embed)
 
+    target = await get_user_data(member.id)
+
     if target["balance"] < 100:
         embed = create_aesthetic_embed("💸 No Money", "║ Target is too poor to steal from! ║", discord.Color.red())
+        await cooldowns.release("steal", ctx.author.id)
         return await ctx.send(embed=embed)
 
     # Check if target has crime protection
-    if await has_active_effect(member.id, "crime_protection"):
+    if (await get_effect_snapshot(member.id, target)).has("crime_protection"):
         embed = create_aesthetic_embed("🛡️ Target Protected",
                                      f"║ {member.display_name} has crime protection active! ║",
                                      discord.Color.blue())
+        await cooldowns.release("steal", ctx.author.id)
         return await ctx.send(embed=embed)
 
     success_rate = 0.4 + (user.get("level", 1) * 0.01)
 
     if random.random() < success_rate:
         stolen_amount = min(random.randint(50, 500), target["balance"] // 4)
-
-        await update_user_data(ctx.author.id, {"balance": user["balance"] + stolen_amount, "last_steal": now})
-        await update_user_data(member.id, {"balance": target["balance"] - stolen_amount})
+        stolen_amount, _, _ = await transfer_balance(member.id, ctx.author.id, stolen_amount, allow_partial=True,
+                                                     recipient_extra={"last_steal": now})
 
         embed = create_aesthetic_embed("🦹 Theft Success", f"║ Stole **{stolen_amount:,}** 💵 from {member.display_name}! ║", discord.Color.green())
     else:
         penalty = 200
-        await update_user_data(ctx.author.id, {"balance": max(0, user["balance"] - penalty), "last_steal": now})
+        await deduct_balance(ctx.author.id, penalty, extra={"last_steal": now})
 
         embed = create_aesthetic_embed("🚨 Caught Red-Handed", f"║ Failed to steal and lost **{penalty:,}** 💵! ║", discord.Color.red())
 
     await ctx.send(embed=embed)
 
 @bot.command()
+@releases_cooldown_on_error
 async def rob(ctx, member: discord.Member):
     """Rob another user for their money"""
     if member == ctx.author:
@@ -1489,13 +2787,11 @@ async def rob(ctx, member: discord.Member):
         embed = create_aesthetic_embed("👑 Owner Protection", "║ You can't rob the bot owner! ║", discord.Color.gold())
         return await ctx.send(embed=embed)
 
-    user = await get_user_data(ctx.author.id)
-    target = await get_user_data(member.id)
     now = datetime.datetime.now()
 
     # Check cooldown - 10 minutes
-    if user.get("last_rob") and (now - user["last_rob"].replace(tzinfo=None)).seconds < 600:
-        remaining = 600 - (now - user["last_rob"].replace(tzinfo=None)).seconds
+    remaining, user = await check_cooldown("rob", ctx.author.id)
+    if remaining:
         minutes = remaining // 60
         seconds = remaining % 60
         embed = create_aesthetic_embed("🕵️ Laying Low",
@@ -1503,19 +2799,23 @@ async def rob(ctx, member: discord.Member):
                                      discord.Color.orange())
         return await ctx.send(embed=embed)
 
+    target = await get_user_data(member.id)
+
     # Check if target has enough money
     if target["balance"] < 100:
         embed = create_aesthetic_embed("💸 Poor Target",
                                      f"║ {member.display_name} is too poor to rob! (Less than 100 💵) ║",
                                      discord.Color.red())
+        await cooldowns.release("rob", ctx.author.id)
         return await ctx.send(embed=embed)
 
     # Check if target has crime protection
-    if await has_active_effect(member.id, "crime_protection"):
+    if (await get_effect_snapshot(member.id, target)).has("crime_protection"):
         embed = create_aesthetic_embed("🛡️ Target Protected",
                                      f"║ {member.display_name} has crime protection active! ║\n"
                                      f"║ They cannot be robbed right now! ║",
                                      discord.Color.blue())
+        await cooldowns.release("rob", ctx.author.id)
         return await ctx.send(embed=embed)
 
     # Base success rate of 45% (not affected by level)
@@ -1539,14 +2839,9 @@ async def rob(ctx, member: discord.Member):
         stolen_amount = min(int(target["balance"] * steal_percentage), target["balance"])
         stolen_amount = max(stolen_amount, 100)  # Minimum steal amount
 
-        # Update balances
-        await update_user_data(ctx.author.id, {
-            "balance": user["balance"] + stolen_amount,
-            "last_rob": now
-        })
-        await update_user_data(member.id, {
-            "balance": target["balance"] - stolen_amount
-        })
+        # Move the money in one conditional debit + credit
+        stolen_amount, _, robber = await transfer_balance(member.id, ctx.author.id, stolen_amount, allow_partial=True,
+                                                          recipient_extra={"last_rob": now})
 
         description = f"""
 ╔══════════════════════════════════╗
@@ -1557,7 +2852,7 @@ async def rob(ctx, member: discord.Member):
 ║ **Risk Level:** {selected_scenario['risk']}
 ║ **Amount Stolen:** {stolen_amount:,} 💵
 ║ **Success Rate:** {int(success_rate * 100)}%
-║ **Your New Balance:** {user['balance'] + stolen_amount:,} 💵
+║ **Your New Balance:** {robber['balance']:,} 💵
 ╚══════════════════════════════════╝
 """
 
@@ -1569,7 +2864,6 @@ async def rob(ctx, member: discord.Member):
     else:
         # Failure - lose money and get caught
         penalty = random.randint(200, 800)
-        penalty = min(penalty, user["balance"])  # Don't go negative
 
         fail_scenarios = [
             {"text": "🚔 Caught red-handed by police", "emoji": "🚔"},
@@ -1582,10 +2876,8 @@ async def rob(ctx, member: discord.Member):
 
         fail_scenario = random.choice(fail_scenarios)
 
-        await update_user_data(ctx.author.id, {
-            "balance": max(0, user["balance"] - penalty),
-            "last_rob": now
-        })
+        # Don't go negative
+        penalty, robber = await deduct_balance(ctx.author.id, penalty, extra={"last_rob": now})
 
         description = f"""
 ╔══════════════════════════════════╗
@@ -1595,7 +2887,7 @@ async def rob(ctx, member: discord.Member):
 ║ **Target:** {member.display_name}
 ║ **Failure:** {fail_scenario['text']}
 ║ **Penalty:** -{penalty:,} 💵
-║ **New Balance:** {max(0, user['balance'] - penalty):,} 💵
+║ **New Balance:** {robber['balance']:,} 💵
 ╚══════════════════════════════════╝
 """
 
@@ -1626,9 +2918,11 @@ async def spin(ctx, amount: int):
 
     multiplier = random.choices(multipliers, weights=weights)[0]
     winnings = int(amount * multiplier) - amount
-    new_balance = user["balance"] + winnings
 
-    await update_user_data(ctx.author.id, {"balance": new_balance})
+    # The stake must still be there when the result is applied
+    if await change_balance(ctx.author.id, winnings, min_balance=amount) is None:
+        embed = create_aesthetic_embed("💸 Insufficient Funds", f"║ You need **{amount:,}** 💵 to spin! ║", discord.Color.red())
+        return await ctx.send(embed=embed)
 
     if multiplier == 0:
         result = f"Lost **{amount:,}** 💵"
@@ -1665,15 +2959,16 @@ async def race(ctx, bet: int):
 
     if winner == your_pick:
         winnings = bet * 4
-        new_balance = user["balance"] + winnings
         result_text = f"Your {your_pick} won! Earned **{winnings:,}** 💵"
         color = discord.Color.green()
     else:
-        new_balance = user["balance"] - bet
+        winnings = -bet
         result_text = f"Your {your_pick} lost. Winner was {winner}. Lost **{bet:,}** 💵"
         color = discord.Color.red()
 
-    await update_user_data(ctx.author.id, {"balance": new_balance})
+    if await change_balance(ctx.author.id, winnings, min_balance=bet) is None:
+        embed = create_aesthetic_embed("💸 Insufficient Funds", f"║ You need **{bet:,}** 💵 to bet! ║", discord.Color.red())
+        return await ctx.send(embed=embed)
 
     embed = create_aesthetic_embed("🏁 Animal Race", f"║ {result_text} ║", color)
     await ctx.send(embed=embed)
@@ -1696,11 +2991,9 @@ async def duel(ctx, member: discord.Member, amount: int):
     winner = random.choice([ctx.author, member])
     loser = member if winner == ctx.author else ctx.author
 
-    winner_data = await get_user_data(winner.id)
-    loser_data = await get_user_data(loser.id)
-
-    await update_user_data(winner.id, {"balance": winner_data["balance"] + amount})
-    await update_user_data(loser.id, {"balance": loser_data["balance"] - amount})
+    if await transfer_balance(loser.id, winner.id, amount) is None:
+        embed = create_aesthetic_embed("💸 Insufficient Funds", "║ Both players need enough money for the duel! ║", discord.Color.red())
+        return await ctx.send(embed=embed)
 
     embed = create_aesthetic_embed("⚔️ Duel Result", f"║ **{winner.display_name}** defeated **{loser.display_name}** and won **{amount:,}** 💵! ║", discord.Color.gold())
     await ctx.send(embed=embed)
@@ -1863,19 +3156,14 @@ async def trivia(ctx):
         user_answer = answer.content.lower().strip()
 
         if user_answer in correct_answers or any(ans in user_answer for ans in correct_answers):
-            user = await get_user_data(ctx.author.id)
-
             # Bonus for streak (every 5 questions in a row)
             streak_bonus = 0
             if len(user_trivia_history[user_id]) % 5 == 0 and len(user_trivia_history[user_id]) > 0:
                 streak_bonus = question['reward'] // 2
 
             total_reward = question['reward'] + streak_bonus
-            new_balance = user["balance"] + total_reward
-            await update_user_data(ctx.author.id, {"balance": new_balance})
-
-            # Add XP for correct answer
-            leveled_up, new_level = await add_xp(ctx.author.id, 25)
+            # Money and XP for the correct answer in one write
+            leveled_up, new_level, _ = await grant_reward(ctx.author.id, total_reward, 25)
 
             result_description = f"║ **Correct!** You earned **{total_reward:,}** 💵 ║"
             if streak_bonus > 0:
@@ -2048,8 +3336,6 @@ async def riddle(ctx):
         correct = any(ans.lower() in user_answer or user_answer in ans.lower() for ans in riddle['a'])
 
         if correct:
-            user = await get_user_data(ctx.author.id)
-
             # Difficulty bonus
             difficulty_multiplier = {"Easy": 1.0, "Medium": 1.2, "Hard": 1.5}
             multiplier = difficulty_multiplier.get(riddle['difficulty'], 1.0)
@@ -2060,13 +3346,10 @@ async def riddle(ctx):
                 streak_bonus = int(riddle['reward'] * 0.5)
 
             total_reward = int(riddle['reward'] * multiplier) + streak_bonus
-            new_balance = user["balance"] + total_reward
-            await update_user_data(ctx.author.id, {"balance": new_balance})
-
             # Add XP based on difficulty
             xp_rewards = {"Easy": 30, "Medium": 50, "Hard": 80}
             xp_gained = xp_rewards.get(riddle['difficulty'], 40)
-            leveled_up, new_level = await add_xp(ctx.author.id, xp_gained)
+            leveled_up, new_level, _ = await grant_reward(ctx.author.id, total_reward, xp_gained)
 
             result_description = f"║ **🎉 RIDDLE SOLVED! 🎉** ║\n"
             result_description += f"║ Base Reward: {riddle['reward']:,} 💵 ║\n"
@@ -2099,13 +3382,13 @@ async def riddle(ctx):
         await ctx.send(embed=embed)
 
 @bot.command()
+@releases_cooldown_on_error
 async def quest(ctx):
     """Go on adventures for rewards"""
-    user = await get_user_data(ctx.author.id)
     now = datetime.datetime.now()
 
-    if user.get("last_quest") and (now - user["last_quest"].replace(tzinfo=None)).seconds < 1200:
-        remaining = 1200 - (now - user["last_quest"].replace(tzinfo=None)).seconds
+    remaining, user = await check_cooldown("quest", ctx.author.id)
+    if remaining:
         embed = create_aesthetic_embed("🗡️ Already Questing", f"║ Complete current quest in **{remaining//60}m {remaining%60}s**! ║", discord.Color.orange())
         await ctx.send(embed=embed)
         return  # Early return to prevent further execution
@@ -2122,10 +3405,7 @@ async def quest(ctx):
     success_rate = 0.6 + (user.get("level", 1) * 0.02)
 
     if random.random() < success_rate:
-        new_balance = user["balance"] + quest["reward"]
-        leveled_up, new_level = await add_xp(ctx.author.id, quest["xp"])
-
-        await update_user_data(ctx.author.id, {"balance": new_balance, "last_quest": now})
+        leveled_up, new_level, _ = await grant_reward(ctx.author.id, quest["reward"], quest["xp"], extra={"last_quest": now})
 
         result_text = f"║ **Quest:** {quest['name']} ║\n║ **Reward:** {quest['reward']:,} 💵 ║\n║ **XP Gained:** {quest['xp']} ⭐ ║"
         if leveled_up:
@@ -2138,61 +3418,6 @@ async def quest(ctx):
 
     await ctx.send(embed=embed)
 
-# More social/action commands
-@bot.command()
-async def wave(ctx, member: discord.Member = None):
-    """Wave at someone"""
-    if member:
-        embed = create_aesthetic_embed("👋 Wave", f"║ **{ctx.author.display_name}** waves at **{member.display_name}**! ║", discord.Color.blue())
-    else:
-        embed = create_aesthetic_embed("👋 Wave", f"║ **{ctx.author.display_name}** waves at everyone! ║", discord.Color.blue())
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def boop(ctx, member: discord.Member):
-    """Boop someone's nose"""
-    embed = create_aesthetic_embed("👉 Boop", f"║ **{ctx.author.display_name}** boops **{member.display_name}**'s nose! ║", discord.Color.pink())
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def snuggle(ctx, member: discord.Member):
-    """Snuggle with someone"""
-    embed = create_aesthetic_embed("🤗 Snuggle", f"║ **{ctx.author.display_name}** snuggles with **{member.display_name}**! ║", discord.Color.pink())
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def handhold(ctx, member: discord.Member):
-    """Hold hands with someone"""
-    embed = create_aesthetic_embed("🤝 Hand Hold", f"║ **{ctx.author.display_name}** holds hands with **{member.display_name}**! ║", discord.Color.pink())
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def greet(ctx, member: discord.Member = None):
-    """Greet someone"""
-    if member:
-        embed = create_aesthetic_embed("👋 Greeting", f"║ **{ctx.author.display_name}** greets **{member.display_name}**! ║", discord.Color.green())
-    else:
-        embed = create_aesthetic_embed("👋 Greeting", f"║ **{ctx.author.display_name}** greets everyone! ║", discord.Color.green())
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def bully(ctx, member: discord.Member):
-    """Playfully bully someone"""
-    embed = create_aesthetic_embed("😈 Bully", f"║ **{ctx.author.display_name}** playfully bullies **{member.display_name}**! ║", discord.Color.orange())
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def protect(ctx, member: discord.Member):
-    """Protect someone"""
-    embed = create_aesthetic_embed("🛡️ Protect", f"║ **{ctx.author.display_name}** protects **{member.display_name}**! ║", discord.Color.blue())
-    await ctx.send(embed=embed)
-
-@bot.command()
-async def feed(ctx, member: discord.Member):
-    """Feed someone"""
-    embed = create_aesthetic_embed("🍽️ Feed", f"║ **{ctx.author.display_name}** feeds **{member.display_name}**! ║", discord.Color.yellow())
-    await ctx.send(embed=embed)
-
 # More utility/fun commands
 @bot.command()
 async def dinosaur(ctx):
@@ -2328,14 +3553,14 @@ async def serverinfo(ctx):
     await ctx.send(embed=embed)
 
 @bot.command()
+@releases_cooldown_on_error
 async def crime(ctx):
     """Commit a crime for big rewards (or penalties) with enhanced visuals"""
-    user = await get_user_data(ctx.author.id)
     now = datetime.datetime.now()
 
     # Check cooldown
-    if user["last_crime"] and (now - user["last_crime"].replace(tzinfo=None)).seconds < 1800:
-        remaining = 1800 - (now - user["last_crime"].replace(tzinfo=None)).seconds
+    remaining, user = await check_cooldown("crime", ctx.author.id)
+    if remaining:
         minutes = remaining // 60
         seconds = remaining % 60
 
@@ -2368,12 +3593,8 @@ async def crime(ctx):
         base_amount = random.randint(*crime_range)
         crime_bonus = int(base_amount * selected_crime["multiplier"])
         total_amount = base_amount + level_bonus + crime_bonus
-        new_balance = user["balance"] + total_amount
-
-        await update_user_data(ctx.author.id, {
-            "balance": new_balance,
-            "last_crime": now
-        })
+        updated = await change_balance(ctx.author.id, total_amount, extra={"last_crime": now})
+        new_balance = updated["balance"]
 
         description = f"""
 ╔══════════════════════════════════╗
@@ -2406,12 +3627,8 @@ async def crime(ctx):
         ]
 
         fail_scenario = random.choice(fail_scenarios)
-        new_balance = max(0, user["balance"] - penalty)
-
-        await update_user_data(ctx.author.id, {
-            "balance": new_balance,
-            "last_crime": now
-        })
+        _, updated = await deduct_balance(ctx.author.id, penalty, extra={"last_crime": now})
+        new_balance = updated["balance"]
 
         description = f"""
 ╔══════════════════════════════════╗
@@ -2712,14 +3929,12 @@ async def on_ready():
 @bot.event
 async def on_command(ctx):
     """Check if user is banned before processing commands"""
-    if ctx.author.id != OWNER_ID:  # Owner can always use commands
-        user_data = await get_user_data(ctx.author.id)
-        if user_data.get("bot_banned", False):
-            embed = create_aesthetic_embed("🚫 Banned",
-                                         "║ You are banned from using this bot! ║",
-                                         discord.Color.red())
-            await ctx.send(embed=embed)
-            return
+    if is_bot_banned(ctx.author.id):  # Owner can always use commands
+        embed = create_aesthetic_embed("🚫 Banned",
+                                     "║ You are banned from using this bot! ║",
+                                     discord.Color.red())
+        await ctx.send(embed=embed)
+        return
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -2746,17 +3961,17 @@ async def on_command_error(ctx, error):
 async def top(ctx, category="balance"):
     """Show top users by balance, level, or xp"""
     if category.lower() in ["balance", "money", "cash"]:
-        top_users = users.find().sort("balance", -1).limit(10)
+        top_users = leaderboards.top("balance", 10)
         title = "💰 Top Richest Users"
         field_name = "Balance"
         emoji = "💵"
     elif category.lower() in ["level", "lvl"]:
-        top_users = users.find().sort("level", -1).limit(10)
+        top_users = leaderboards.top("level", 10)
         title = "📊 Top Level Users"
         field_name = "Level"
         emoji = "⭐"
     elif category.lower() in ["xp", "experience"]:
-        top_users = users.find().sort("xp", -1).limit(10)
+        top_users = leaderboards.top("xp", 10)
         title = "⭐ Top XP Users"
         field_name = "XP"
         emoji = "✨"
@@ -2765,20 +3980,20 @@ async def top(ctx, category="balance"):
 
     embed = discord.Embed(title=title, color=discord.Color.gold())
 
+    names = await resolve_display_names([user_data["_id"] for user_data in top_users], ctx.guild)
     ranking = []
     for i, user_data in enumerate(top_users, 1):
-        try:
-            user = await bot.fetch_user(user_data["_id"])
-            if category.lower() in ["balance", "money", "cash"]:
-                value = f"{user_data.get('balance', 0)} {emoji}"
-            elif category.lower() in ["level", "lvl"]:
-                value = f"{user_data.get('level', 1)} {emoji}"
-            else:
-                value = f"{user_data.get('xp', 0)} {emoji}"
-
-            ranking.append(f"**{i}.** {user.display_name} - {value}")
-        except:
+        name = names.get(user_data["_id"])
+        if name is None:
             continue
+        if category.lower() in ["balance", "money", "cash"]:
+            value = f"{user_data.get('balance', 0)} {emoji}"
+        elif category.lower() in ["level", "lvl"]:
+            value = f"{user_data.get('level', 1)} {emoji}"
+        else:
+            value = f"{user_data.get('xp', 0)} {emoji}"
+
+        ranking.append(f"**{i}.** {name} - {value}")
 
     if ranking:
         embed.description = "\n".join(ranking)
@@ -2789,13 +4004,13 @@ async def top(ctx, category="balance"):
 
 # Animal commands
 @bot.command()
+@releases_cooldown_on_error
 async def hunt(ctx):
     """Hunt for multiple animals with enhanced visuals"""
-    user = await get_user_data(ctx.author.id)
     now = datetime.datetime.now()
 
-    if user["last_hunt"] and (now - user["last_hunt"].replace(tzinfo=None)).seconds < 2:
-        remaining = 2 - (now - user["last_hunt"].replace(tzinfo=None)).seconds
+    remaining, user = await check_cooldown("hunt", ctx.author.id)
+    if remaining:
 
         embed = create_aesthetic_embed("🏹 Bow Recharging",
                                      f"║ Your hunting equipment needs a quick rest! ║\n"
@@ -2835,6 +4050,7 @@ async def hunt(ctx):
     selected_scenario = random.choice(hunt_scenarios)
 
     caught_animals = []
+    caught_counts = {}
     total_value = 0
     legendary_count = 0
     rare_count = 0
@@ -2853,7 +4069,7 @@ async def hunt(ctx):
         selected_animal = random.choices(animals, weights=weights)[0]
         item_name, item_data = selected_animal
 
-        await add_item(ctx.author.id, item_name)
+        caught_counts[item_name] = caught_counts.get(item_name, 0) + 1
         caught_animals.append((item_name, item_data))
         total_value += item_data["value"]
 
@@ -2863,10 +4079,15 @@ async def hunt(ctx):
         elif item_data["rarity"] <= 0.05:
             rare_count += 1
 
-    await update_user_data(ctx.author.id, {"last_hunt": now})
+    await update_inventory(ctx.author.id, caught_counts)
+
+    # XP reward based on catches, written together with the cooldown
+    xp_gained = num_catches * 25 + (legendary_count * 100) + (rare_count * 50)
+    leveled_up, new_level, _ = await grant_reward(ctx.author.id, xp=xp_gained, extra={"last_hunt": now})
 
     # Apply hunt multiplier to total value
-    hunt_multiplier = await get_active_multiplier(ctx.author.id, "hunt")
+    effects = await get_effect_snapshot(ctx.author.id, user)
+    hunt_multiplier = effects.multiplier("hunt")
     if hunt_multiplier > 1.0:
         total_value = int(total_value * hunt_multiplier)
 
@@ -2897,9 +4118,9 @@ async def hunt(ctx):
 
     # Add shop effects info
     active_effects = []
-    if await has_active_effect(ctx.author.id, "pocket_watch"):
+    if effects.has("pocket_watch"):
         active_effects.append("⌚ Pocket Watch (+25% rare chance)")
-    if await has_active_effect(ctx.author.id, "hunting_gear"):
+    if effects.has("hunting_gear"):
         active_effects.append("🎯 Advanced Gear (+10% multi-catch)")
     if hunt_multiplier > 1.0:
         active_effects.append(f"🛍️ Value Multiplier (x{hunt_multiplier})")
@@ -2926,10 +4147,6 @@ async def hunt(ctx):
     embed.add_field(name="📊 Success Rate", value="95% expedition success", inline=True)
     embed.add_field(name="🎁 Bonus Items", value=f"Level {level} Hunter Bonus", inline=True)
 
-    # Add XP reward based on catches
-    xp_gained = num_catches * 25 + (legendary_count * 100) + (rare_count * 50)
-    leveled_up, new_level = await add_xp(ctx.author.id, xp_gained)
-
     if leveled_up:
         embed.add_field(name="🎊 LEVEL UP!", value=f"**Level {new_level}** achieved!", inline=False)
 
@@ -2944,13 +4161,13 @@ async def hunt(ctx):
     await ctx.send(embed=embed)
 
 @bot.command()
+@releases_cooldown_on_error
 async def fish(ctx):
     """Go fishing and catch items"""
-    user = await get_user_data(ctx.author.id)
     now = datetime.datetime.now()
 
-    if user["last_fish"] and (now - user["last_fish"].replace(tzinfo=None)).seconds < 300:
-        remaining = 300 - (now - user["last_fish"].replace(tzinfo=None)).seconds
+    remaining, user = await check_cooldown("fish", ctx.author.id)
+    if remaining:
         return await ctx.send(f"Your arms are tired! Try again in {remaining} seconds.")
 
     # Use rarity for random selection
@@ -2983,7 +4200,7 @@ async def fish(ctx):
 async def zoo(ctx, member: discord.Member = None):
     """View your animal collection categorized by rarity"""
     member = member or ctx.author
-    inventory = inventories.find_one({"_id": member.id})
+    inventory = await inventories_db.find_one({"_id": member.id})
 
     if not inventory or not inventory.get("items"):
         embed = create_aesthetic_embed("🏞️ Empty Zoo",
@@ -3191,26 +4408,25 @@ SHOP_ITEMS = {
     }
 }
 
-# Track user shop purchases and active effects
-user_shop_data = {}
+# Shop state
+# Purchases live in the user document's "shop" field, so they survive restarts
+# and are read from the cached user like everything else:
+#   effects: {item_id: end time}, permanent: {item_id: True},
+#   purchases: {item_id: count bought on purchase_day}
+# shop_expires_at holds the earliest effect end time; the sweeper uses it to find
+# users with expired effects and $unset them, so reads never have to delete.
+SHOP_SWEEP_SECONDS = int(os.getenv("SHOP_SWEEP_SECONDS", "300"))
 
 async def get_user_shop_data(user_id):
     """Get user's shop data"""
-    if user_id not in user_shop_data:
-        user_shop_data[user_id] = {
-            "daily_purchases": {},
-            "active_effects": {},
-            "permanent_items": [],
-            "last_reset": datetime.datetime.now().date()
-        }
-
-    # Reset daily purchases if it's a new day
-    today = datetime.datetime.now().date()
-    if user_shop_data[user_id]["last_reset"] != today:
-        user_shop_data[user_id]["daily_purchases"] = {}
-        user_shop_data[user_id]["last_reset"] = today
-
-    return user_shop_data[user_id]
+    user = await get_user_data(user_id)
+    shop = user.get("shop") or {}
+    today = datetime.datetime.now().date().isoformat()
+    return {
+        "daily_purchases": shop.get("purchases", {}) if shop.get("purchase_day") == today else {},
+        "active_effects": shop.get("effects", {}),
+        "permanent_items": list(shop.get("permanent", {}))
+    }
 
 async def check_daily_limit(user_id, item_id):
     """Check if user can still buy this item today"""
@@ -3220,46 +4436,126 @@ async def check_daily_limit(user_id, item_id):
     purchased_today = shop_data["daily_purchases"].get(item_id, 0)
     return purchased_today < item["daily_limit"]
 
-async def add_shop_effect(user_id, item_id):
-    """Add an active effect to user"""
-    shop_data = await get_user_shop_data(user_id)
-    item = SHOP_ITEMS[item_id]
+def _field_is(value):
+    """Filter that matches a field holding exactly value, or missing when value is None"""
+    return value if value is not None else {"$exists": False}
 
-    if item["duration"] == -1:  # Permanent item
-        if item_id not in shop_data["permanent_items"]:
-            shop_data["permanent_items"].append(item_id)
-    else:  # Temporary effect
-        end_time = datetime.datetime.now() + datetime.timedelta(seconds=item["duration"])
-        shop_data["active_effects"][item_id] = end_time
+async def buy_shop_item(user_id, item_id):
+    """Charge for an item and apply its effect in one conditional update
 
-async def has_active_effect(user_id, effect_name):
-    """Check if user has an active effect"""
-    shop_data = await get_user_shop_data(user_id)
-    now = datetime.datetime.now()
-
-    # Check temporary effects
-    if effect_name in shop_data["active_effects"]:
-        if shop_data["active_effects"][effect_name] > now:
-            return True
+    The filter re-checks funds, the daily limit and the shop state the update
+    was built from, so concurrent or stale purchases can't overspend, exceed the
+    limit or reset today's counts. Returns (status, user) where status is "ok",
+    "funds", "limit" or "owned"; user is the updated document when "ok"."""
+    item = SHOP_ITEMS[item_id]
+    for _ in range(3):
+        now = datetime.datetime.now()
+        today = now.date().isoformat()
+        user = await get_user_data(user_id)
+        shop = user.get("shop") or {}
+        purchased_today = shop.get("purchases", {}).get(item_id, 0) if shop.get("purchase_day") == today else 0
+
+        if user["balance"] < item["price"]:
+            return "funds", None
+        if purchased_today >= item["daily_limit"]:
+            return "limit", None
+        if item["duration"] == -1 and item_id in shop.get("permanent", {}):
+            return "owned", None
+
+        query = {"_id": user_id, "balance": {"$gte": item["price"]},
+                 "shop.purchase_day": _field_is(shop.get("purchase_day"))}
+        update = {"$inc": {"balance": -item["price"]}, "$set": {}}
+        if shop.get("purchase_day") == today:
+            count_field = f"shop.purchases.{item_id}"
+            query["$or"] = [{count_field: {"$exists": False}}, {count_field: {"$lt": item["daily_limit"]}}]
+            update["$inc"][count_field] = 1
         else:
-            # Effect expired, remove it
-            del shop_data["active_effects"][effect_name]
-
-    # Check permanent items
-    return effect_name in shop_data["permanent_items"]
-
-async def get_active_multiplier(user_id, multiplier_type):
-    """Get active multiplier value for a specific type"""
-    multiplier = 1.0
-
-    if multiplier_type == "daily" and await has_active_effect(user_id, "daily_multiplier"):
-        multiplier = 1.5
-    elif multiplier_type == "work" and await has_active_effect(user_id, "work_multiplier"):
-        multiplier = 1.3
-    elif multiplier_type == "hunt" and await has_active_effect(user_id, "hunt_multiplier"):
-        multiplier = 1.4
+            update["$set"]["shop.purchase_day"] = today
+            update["$set"]["shop.purchases"] = {item_id: 1}
+
+        if item["duration"] == -1:  # Permanent item
+            query[f"shop.permanent.{item_id}"] = {"$exists": False}
+            update["$set"][f"shop.permanent.{item_id}"] = True
+        else:  # Temporary effect
+            # shop_expires_at is the earliest end among the live effects once this
+            # one is (re)set. Leaving out already expired ones keeps it in the future,
+            # so a sweep that read the document before this purchase no longer matches
+            end_time = now + datetime.timedelta(seconds=item["duration"])
+            ends = [end for name, end in shop.get("effects", {}).items() if name != item_id and end > now]
+            query["shop_expires_at"] = _field_is(user.get("shop_expires_at"))
+            update["$set"][f"shop.effects.{item_id}"] = end_time
+            update["$set"]["shop_expires_at"] = min(ends + [end_time])
+
+        buyer = await users_db.find_one_and_update(query, update)
+        if buyer is not None:
+            user_cache.set(user_id, buyer)
+            leaderboards.record(user_id, buyer)
+            return "ok", dict(buyer)
+        user_cache.pop(user_id)  # our copy was stale, reread and re-check
+    return "funds", None
+
+# Which effect boosts which reward, and by how much
+EFFECT_MULTIPLIERS = {
+    "daily_multiplier": ("daily", 1.5),
+    "work_multiplier": ("work", 1.3),
+    "hunt_multiplier": ("hunt", 1.4),
+}
 
-    return multiplier
+class EffectSnapshot:
+    """A user's active shop effects, resolved once per command"""
+    __slots__ = ("active", "multipliers")
+
+    def __init__(self, shop=None, now=None):
+        shop = shop or {}
+        now = now or datetime.datetime.now()
+        # Expired effects are left for the sweeper, they just don't count here
+        active = [name for name, end_time in shop.get("effects", {}).items() if end_time > now]
+        active.extend(shop.get("permanent", {}))
+        self.active = frozenset(active)
+        self.multipliers = {kind: value for name, (kind, value) in EFFECT_MULTIPLIERS.items()
+                            if name in self.active}
+
+    def has(self, effect_name):
+        return effect_name in self.active
+
+    def multiplier(self, multiplier_type):
+        return self.multipliers.get(multiplier_type, 1.0)
+
+async def get_effect_snapshot(user_id, user=None):
+    """Resolve a user's effects, reusing an already loaded user document"""
+    if user is None:
+        user = await get_user_data(user_id)
+    return EffectSnapshot(user.get("shop"))
+
+async def expire_shop_effects():
+    """Remove expired effects from every user whose earliest effect has ended"""
+    now = datetime.datetime.now()
+    due = await users_db.find({"shop_expires_at": {"$lte": now}},
+                              projection={"shop": 1, "shop_expires_at": 1})
+    for doc in due:
+        effects = (doc.get("shop") or {}).get("effects", {})
+        unset = {f"shop.effects.{item_id}": "" for item_id, end_time in effects.items() if end_time <= now}
+        upcoming = [end_time for end_time in effects.values() if end_time > now]
+        update = {}
+        if upcoming:
+            update["$set"] = {"shop_expires_at": min(upcoming)}
+        else:
+            unset["shop_expires_at"] = ""
+        if unset:
+            update["$unset"] = unset  # older MongoDB rejects an empty $unset
+
+        updated = await users_db.find_one_and_update(
+            {"_id": doc["_id"], "shop_expires_at": {"$lte": now}}, update)
+        if updated is not None and user_cache.peek(doc["_id"]) is not None:
+            user_cache.set(doc["_id"], updated)
+    return len(due)
+
+@tasks.loop(seconds=SHOP_SWEEP_SECONDS)
+async def sweep_shop_effects():
+    try:
+        await expire_shop_effects()
+    except Exception as e:
+        print(f"Failed to sweep shop effects: {e}")
 
 @bot.command()
 async def shop(ctx, action="view", *, item_name=""):
@@ -3370,23 +4666,32 @@ async def shop(ctx, action="view", *, item_name=""):
             return await ctx.send(embed=embed)
 
         # Check if they already have this permanent item
-        if item_data["duration"] == -1 and await has_active_effect(ctx.author.id, item_id):
+        if item_data["duration"] == -1 and (await get_effect_snapshot(ctx.author.id, user)).has(item_id):
             embed = create_aesthetic_embed("⚠️ Already Owned",
                                          f"║ You already own **{item_data['name']}**! ║\n"
                                          f"║ Permanent items can only be bought once ║",
                                          discord.Color.orange())
             return await ctx.send(embed=embed)
 
-        # Process purchase
-        new_balance = user["balance"] - item_data["price"]
-        await update_user_data(ctx.author.id, {"balance": new_balance})
-
-        # Add to daily purchases
-        shop_data = await get_user_shop_data(ctx.author.id)
-        shop_data["daily_purchases"][item_id] = shop_data["daily_purchases"].get(item_id, 0) + 1
-
-        # Add effect
-        await add_shop_effect(ctx.author.id, item_id)
+        # Process purchase; the conditional debit stops two purchases spending the same money
+        status, buyer = await buy_shop_item(ctx.author.id, item_id)
+        if status == "limit":
+            embed = create_aesthetic_embed("🚫 Daily Limit Reached",
+                                         f"║ **{item_data['name']}** daily limit: {item_data['daily_limit']} ║",
+                                         discord.Color.orange())
+            return await ctx.send(embed=embed)
+        if status == "owned":
+            embed = create_aesthetic_embed("⚠️ Already Owned",
+                                         f"║ You already own **{item_data['name']}**! ║",
+                                         discord.Color.orange())
+            return await ctx.send(embed=embed)
+        if status != "ok":
+            embed = create_aesthetic_embed("💸 Insufficient Funds",
+                                         f"║ **{item_data['name']}** costs **{item_data['price']:,}** 💵 ║",
+                                         discord.Color.red())
+            return await ctx.send(embed=embed)
+        new_balance = buyer["balance"]
+        purchased_today = buyer["shop"]["purchases"][item_id]
 
         # Create purchase confirmation
         duration_text = ""
@@ -3414,7 +4719,7 @@ async def shop(ctx, action="view", *, item_name=""):
         embed = create_aesthetic_embed("Successful Purchase", description, discord.Color.green(), ctx.author.display_avatar.url)
         embed.add_field(name="🎯 Status", value="**ACTIVE** ✅", inline=True)
         embed.add_field(name="📊 Remaining Today",
-                       value=f"{item_data['daily_limit'] - shop_data['daily_purchases'][item_id]}",
+                       value=f"{item_data['daily_limit'] - purchased_today}",
                        inline=True)
         embed.add_field(name="💡 Tip", value="Use `owo shop effects` to see active items!", inline=True)
 
@@ -3429,17 +4734,14 @@ async def shop(ctx, action="view", *, item_name=""):
         permanent_items = []
 
         # Check temporary effects
-        for effect_id, end_time in shop_data["active_effects"].copy().items():
-            if end_time > now:
+        for effect_id, end_time in shop_data["active_effects"].items():
+            if end_time > now and effect_id in SHOP_ITEMS:
                 item_data = SHOP_ITEMS[effect_id]
                 remaining = end_time - now
                 hours = remaining.seconds // 3600
                 minutes = (remaining.seconds % 3600) // 60
 
                 active_effects.append(f"{item_data['emoji']} **{item_data['name']}** - {hours}h {minutes}m left")
-            else:
-                # Remove expired effect
-                del shop_data["active_effects"][effect_id]
 
         # Check permanent items
         for item_id in shop_data["permanent_items"]:
@@ -3500,15 +4802,9 @@ async def give(ctx, member: discord.Member, amount: int):
     if amount <= 0:
         return await ctx.send("Amount must be positive!")
 
-    user = await get_user_data(ctx.author.id)
-    if user["balance"] < amount:
+    if await transfer_balance(ctx.author.id, member.id, amount) is None:
         return await ctx.send("You don't have enough money!")
 
-    await update_user_data(ctx.author.id, {"balance": user["balance"] - amount})
-
-    recipient = await get_user_data(member.id)
-    await update_user_data(member.id, {"balance": recipient["balance"] + amount})
-
     await ctx.send(f"💸 {ctx.author.display_name} gave {amount} 💵 to {member.display_name}!")
 
 # Inventory commands
@@ -3516,7 +4812,7 @@ async def give(ctx, member: discord.Member, amount: int):
 async def inventory(ctx, member: discord.Member = None):
     """View your or someone else's inventory"""
     member = member or ctx.author
-    inventory = inventories.find_one({"_id": member.id})
+    inventory = await inventories_db.find_one({"_id": member.id})
 
     if not inventory or not inventory.get("items"):
         return await ctx.send(f"{member.display_name}'s inventory is empty!")
@@ -3540,7 +4836,7 @@ async def sell(ctx, *, args=""):
     """Sell items from your inventory with enhanced market system"""
     if not args:
         # Show sellable items
-        inventory = inventories.find_one({"_id": ctx.author.id})
+        inventory = await inventories_db.find_one({"_id": ctx.author.id})
         if not inventory or not inventory.get("items"):
             embed = create_aesthetic_embed("📦 Empty Inventory",
                                          "║ You have no items to sell! ║",
@@ -3600,7 +4896,7 @@ async def sell(ctx, *, args=""):
     parts = args.split()
     if parts[0].lower() == "all":
         # Sell all items
-        inventory = inventories.find_one({"_id": ctx.author.id})
+        inventory = await inventories_db.find_one({"_id": ctx.author.id})
         if not inventory or not inventory.get("items"):
             embed = create_aesthetic_embed("📦 Empty Inventory",
                                          "║ You have no items to sell! ║",
@@ -3609,18 +4905,19 @@ async def sell(ctx, *, args=""):
 
         total_value = 0
         sold_items = []
+        sold_counts = {}
 
-        for item_name, quantity in inventory["items"].copy().items():
+        for item_name, quantity in inventory["items"].items():
             if item_name in HUNT_ITEMS:
                 value = HUNT_ITEMS[item_name]["value"] * quantity
                 total_value += value
                 sold_items.append(f"{HUNT_ITEMS[item_name]['emoji']} {item_name} x{quantity}")
-                await remove_item(ctx.author.id, item_name, quantity)
+                sold_counts[item_name] = -quantity
             elif item_name in FISH_ITEMS:
                 value = FISH_ITEMS[item_name]["value"] * quantity
                 total_value += value
                 sold_items.append(f"{FISH_ITEMS[item_name]['emoji']} {item_name} x{quantity}")
-                await remove_item(ctx.author.id, item_name, quantity)
+                sold_counts[item_name] = -quantity
 
         if total_value == 0:
             embed = create_aesthetic_embed("📦 No Sellable Items",
@@ -3628,10 +4925,15 @@ async def sell(ctx, *, args=""):
                                          discord.Color.orange())
             return await ctx.send(embed=embed)
 
-        user = await get_user_data(ctx.author.id)
-        old_balance = user["balance"]
-        new_balance = user["balance"] + total_value
-        await update_user_data(ctx.author.id, {"balance": new_balance})
+        if await update_inventory(ctx.author.id, sold_counts, inventory["items"]) is None:
+            embed = create_aesthetic_embed("❌ Inventory Changed",
+                                         "║ Your inventory changed during the sale, try again! ║",
+                                         discord.Color.red())
+            return await ctx.send(embed=embed)
+
+        user = await change_balance(ctx.author.id, total_value)
+        new_balance = user["balance"]
+        old_balance = new_balance - total_value
 
         description = f"""
 ╔════════════════════════════════════╗
@@ -3682,8 +4984,7 @@ async def sell(ctx, *, args=""):
                                          discord.Color.red())
             return await ctx.send(embed=embed)
 
-        user = await get_user_data(ctx.author.id)
-        inventory = inventories.find_one({"_id": ctx.author.id})
+        inventory = await inventories_db.find_one({"_id": ctx.author.id})
 
         if not inventory or not inventory.get("items"):
             embed = create_aesthetic_embed("📦 Empty Inventory",
@@ -3733,12 +5034,16 @@ async def sell(ctx, *, args=""):
         emoji = item_data["emoji"]
         rarity = item_data["type"]
         total_value = value_per_item * amount
-        old_balance = user["balance"]
-        new_balance = user["balance"] + total_value
 
         # Process the sale FIRST
-        await remove_item(ctx.author.id, found_item, amount)
-        await update_user_data(ctx.author.id, {"balance": new_balance})
+        if await update_inventory(ctx.author.id, {found_item: -amount}, inventory["items"]) is None:
+            embed = create_aesthetic_embed("❌ Insufficient Quantity",
+                                         f"║ You no longer have **{amount}** {found_item}(s)! ║",
+                                         discord.Color.red())
+            return await ctx.send(embed=embed)
+        user = await change_balance(ctx.author.id, total_value)
+        new_balance = user["balance"]
+        old_balance = new_balance - total_value
 
         # Determine rarity color and bonus
         rarity_colors = {
@@ -3838,21 +5143,21 @@ async def slots(ctx, amount):
         result = f"You lost {amount} 💵"
         color = discord.Color.red()
 
-    new_balance = user["balance"] + winnings
-    await update_user_data(ctx.author.id, {"balance": new_balance})
+    if await change_balance(ctx.author.id, winnings, min_balance=amount) is None:
+        return await ctx.send("You don't have enough money!")
 
     embed = create_aesthetic_embed("🎰 Slots", f"║ {' | '.join(slots)} 🎰\n{result} ║", color)
     await ctx.send(embed=embed)
 
 @bot.command(aliases=['cf'])
+@releases_cooldown_on_error
 async def coinflip(ctx, amount):
     """Flip a coin with enhanced visuals and 7-second cooldown"""
-    user = await get_user_data(ctx.author.id)
     now = datetime.datetime.now()
 
     # Check for 7-second cooldown
-    if user.get("last_coinflip") and (now - user["last_coinflip"].replace(tzinfo=None)).seconds < 7:
-        remaining = 7 - (now - user["last_coinflip"].replace(tzinfo=None)).seconds
+    remaining, user = await check_cooldown("coinflip", ctx.author.id)
+    if remaining:
         embed = create_aesthetic_embed("⏰ Cooldown Active",
                                      f"║ Coin is still spinning! Wait **{remaining}** seconds ║",
                                      discord.Color.orange())
@@ -3864,6 +5169,7 @@ async def coinflip(ctx, amount):
             embed = create_aesthetic_embed("💸 Empty Balance",
                                          "║ You have no money to bet! ║",
                                          discord.Color.red())
+            await cooldowns.release("coinflip", ctx.author.id)
             return await ctx.send(embed=embed)
         amount = user["balance"]
     else:
@@ -3873,18 +5179,21 @@ async def coinflip(ctx, amount):
             embed = create_aesthetic_embed("❌ Invalid Amount",
                                          "║ Use a number or 'all' to bet everything! ║",
                                          discord.Color.red())
+            await cooldowns.release("coinflip", ctx.author.id)
             return await ctx.send(embed=embed)
 
     if amount <= 0:
         embed = create_aesthetic_embed("❌ Invalid Bet",
                                      "║ You must bet a positive amount! ║",
                                      discord.Color.red())
+        await cooldowns.release("coinflip", ctx.author.id)
         return await ctx.send(embed=embed)
 
     if user["balance"] < amount:
         embed = create_aesthetic_embed("💸 Insufficient Funds",
                                      f"║ You need **{amount:,}** 💵 but only have **{user['balance']:,}** 💵 ║",
                                      discord.Color.red())
+        await cooldowns.release("coinflip", ctx.author.id)
         return await ctx.send(embed=embed)
 
     # Random coin flip
@@ -3895,22 +5204,24 @@ async def coinflip(ctx, amount):
 
     if win:
         winnings = amount
-        new_balance = user["balance"] + winnings
         outcome_text = "🎉 **VICTORY!** 🎉"
         outcome_color = discord.Color.green()
         result_emoji = "✅"
     else:
         winnings = -amount
-        new_balance = user["balance"] - amount
         outcome_text = "💔 **DEFEAT!** 💔"
         outcome_color = discord.Color.red()
         result_emoji = "❌"
 
-    # Update user data
-    await update_user_data(ctx.author.id, {
-        "balance": new_balance,
-        "last_coinflip": now
-    })
+    # Update user data; the stake must still be there when the flip lands
+    updated = await change_balance(ctx.author.id, winnings, min_balance=amount, extra={"last_coinflip": now})
+    if updated is None:
+        embed = create_aesthetic_embed("💸 Insufficient Funds",
+                                     f"║ You need **{amount:,}** 💵 to flip! ║",
+                                     discord.Color.red())
+        await cooldowns.release("coinflip", ctx.author.id)
+        return await ctx.send(embed=embed)
+    new_balance = updated["balance"]
 
     # Create enhanced embed
     # Check if this was an all-in bet
@@ -3944,6 +5255,17 @@ async def coinflip(ctx, amount):
 # Blackjack game (keeping existing implementation)
 blackjack_games = {}
 
+async def refund_blackjack_games():
+    """Return the held bets of open hands, which don't survive a restart"""
+    for user_id, game in list(blackjack_games.items()):
+        if game["finished"]:
+            continue
+        blackjack_games.pop(user_id, None)
+        try:
+            await change_balance(user_id, game["bet"])
+        except Exception as e:
+            print(f"Failed to refund blackjack bet for {user_id}: {e}")
+
 def calculate_hand_value(hand):
     value = 0
     aces = 0
@@ -3983,13 +5305,21 @@ async def blackjack(ctx, amount: int):
     player_hand = [deal_card(), deal_card()]
     dealer_hand = [deal_card(), deal_card()]
 
-    blackjack_games[ctx.author.id] = {
+    # Claim the table before awaiting so a second blackjack can't open another
+    # hand; it stays finished (unplayable) until the bet has actually been taken
+    game = blackjack_games[ctx.author.id] = {
         "player_hand": player_hand,
         "dealer_hand": dealer_hand,
         "bet": amount,
-        "finished": False
+        "finished": True
     }
 
+    # The bet is held for the whole hand; payouts return it plus any winnings
+    if await change_balance(ctx.author.id, -amount, min_balance=amount) is None:
+        blackjack_games.pop(ctx.author.id, None)
+        return await ctx.send("You don't have enough money!")
+    game["finished"] = False
+
     player_value = calculate_hand_value(player_hand)
     dealer_shown = dealer_hand[0]
 
@@ -3999,7 +5329,7 @@ async def blackjack(ctx, amount: int):
 
     if player_value == 21:
         winnings = int(amount * 1.5)
-        await update_user_data(ctx.author.id, {"balance": user["balance"] + winnings})
+        await change_balance(ctx.author.id, amount + winnings)
         del blackjack_games[ctx.author.id]
         embed.add_field(name="Result", value=f"BLACKJACK! You won {winnings} 💵!", inline=False)
     else:
@@ -4026,8 +5356,7 @@ async def hit(ctx):
     embed.add_field(name="Dealer's Hand", value=f"{game['dealer_hand'][0]} ?", inline=False)
 
     if player_value > 21:
-        user = await get_user_data(ctx.author.id)
-        await update_user_data(ctx.author.id, {"balance": user["balance"] - game["bet"]})
+        # The bet was already taken when the hand started
         del blackjack_games[ctx.author.id]
         embed.add_field(name="Result", value=f"BUST! You lost {game['bet']} 💵!", inline=False)
     else:
@@ -4044,6 +5373,7 @@ async def stand(ctx):
     game = blackjack_games[ctx.author.id]
     if game["finished"]:
         return await ctx.send("This game is already finished!")
+    del blackjack_games[ctx.author.id]  # settle once, even if stand is spammed
 
     while calculate_hand_value(game["dealer_hand"]) < 17:
         game["dealer_hand"].append(deal_card())
@@ -4055,24 +5385,21 @@ async def stand(ctx):
     embed.add_field(name="Your Hand", value=f"{' '.join(game['player_hand'])} (Value: {player_value})", inline=False)
     embed.add_field(name="Dealer's Hand", value=f"{' '.join(game['dealer_hand'])} (Value: {dealer_value})", inline=False)
 
-    user = await get_user_data(ctx.author.id)
-
     if dealer_value > 21:
         winnings = game["bet"]
         result = f"Dealer bust! You won {winnings} 💵!"
-        await update_user_data(ctx.author.id, {"balance": user["balance"] + winnings})
+        await change_balance(ctx.author.id, game["bet"] + winnings)
     elif player_value > dealer_value:
         winnings = game["bet"]
         result = f"You won {winnings} 💵!"
-        await update_user_data(ctx.author.id, {"balance": user["balance"] + winnings})
+        await change_balance(ctx.author.id, game["bet"] + winnings)
     elif dealer_value > player_value:
         result = f"Dealer wins! You lost {game['bet']} 💵!"
-        await update_user_data(ctx.author.id, {"balance": user["balance"] - game["bet"]})
     else:
         result = "It's a tie! Your bet is returned."
+        await change_balance(ctx.author.id, game["bet"])
 
     embed.add_field(name="Result", value=result, inline=False)
-    del blackjack_games[ctx.author.id]
     await ctx.send(embed=embed)
 
 # Social commands
@@ -4096,21 +5423,21 @@ async def marry(ctx, member: discord.Member):
     if proposee["married_to"]:
         return await ctx.send(f"{member.display_name} is already married!")
 
-    existing_proposal = marriages.find_one({
+    existing_proposal = await marriages_db.find_one({
         "proposer": member.id,
         "proposee": ctx.author.id,
         "accepted": False
     })
 
     if existing_proposal:
-        marriages.update_one({"_id": existing_proposal["_id"]}, {
+        await marriages_db.update_one({"_id": existing_proposal["_id"]}, {
             "$set": {"accepted": True, "married_at": datetime.datetime.now()}
         })
         await update_user_data(ctx.author.id, {"married_to": member.id})
         await update_user_data(member.id, {"married_to": ctx.author.id})
         return await ctx.send(f"💍 {ctx.author.display_name} has accepted {member.display_name}'s marriage proposal! They are now married! ❤️")
 
-    marriages.insert_one({
+    await marriages_db.insert_one({
         "proposer": ctx.author.id,
         "proposee": member.id,
         "accepted": False,
@@ -4122,7 +5449,7 @@ async def marry(ctx, member: discord.Member):
 @bot.command()
 async def acceptmarriage(ctx, member: discord.Member):
     """Accept a marriage proposal"""
-    proposal = marriages.find_one({
+    proposal = await marriages_db.find_one({
         "proposer": member.id,
         "proposee": ctx.author.id,
         "accepted": False
@@ -4131,7 +5458,7 @@ async def acceptmarriage(ctx, member: discord.Member):
     if not proposal:
         return await ctx.send(f"You don't have a pending proposal from {member.display_name}!")
 
-    marriages.update_one({"_id": proposal["_id"]}, {
+    await marriages_db.update_one({"_id": proposal["_id"]}, {
         "$set": {"accepted": True, "married_at": datetime.datetime.now()}
     })
 
@@ -4143,7 +5470,7 @@ async def acceptmarriage(ctx, member: discord.Member):
 @bot.command()
 async def declinemarriage(ctx, member: discord.Member):
     """Decline a marriage proposal"""
-    proposal = marriages.find_one({
+    proposal = await marriages_db.find_one({
         "proposer": member.id,
         "proposee": ctx.author.id,
         "accepted": False
@@ -4152,7 +5479,7 @@ async def declinemarriage(ctx, member: discord.Member):
     if not proposal:
         return await ctx.send(f"You don't have a pending proposal from {member.display_name}!")
 
-    marriages.delete_one({"_id": proposal["_id"]})
+    await marriages_db.delete_one({"_id": proposal["_id"]})
     await ctx.send(f"💔 {ctx.author.display_name} has declined {member.display_name}'s marriage proposal.")
 
 @bot.command()
@@ -4164,12 +5491,12 @@ async def divorce(ctx):
         return await ctx.send("You're not married!")
 
     spouse_id = user["married_to"]
-    spouse = await bot.fetch_user(spouse_id)
+    spouse_name = await resolve_display_name(spouse_id, ctx.guild)
 
     await update_user_data(ctx.author.id, {"married_to": None})
     await update_user_data(spouse_id, {"married_to": None})
 
-    marriages.update_one({
+    await marriages_db.update_one({
         "$or": [
             {"proposer": ctx.author.id, "proposee": spouse_id},
             {"proposer": spouse_id, "proposee": ctx.author.id}
@@ -4177,7 +5504,7 @@ async def divorce(ctx):
         "accepted": True
     }, {"$set": {"divorced_at": datetime.datetime.now()}})
 
-    await ctx.send(f"💔 {ctx.author.display_name} has divorced {spouse.display_name}. It's a sad day...")
+    await ctx.send(f"💔 {ctx.author.display_name} has divorced {spouse_name}. It's a sad day...")
 
 # Profile commands
 @bot.command()
@@ -4265,8 +5592,8 @@ async def profile(ctx, member: discord.Member = None):
     embed.add_field(name="🎯 Total Ranks", value="3 types", inline=True)
 
     if user["married_to"]:
-        spouse = await bot.fetch_user(user["married_to"])
-        embed.add_field(name="💍 Married to", value=spouse.display_name, inline=False)
+        spouse_name = await resolve_display_name(user["married_to"], ctx.guild)
+        embed.add_field(name="💍 Married to", value=spouse_name, inline=False)
 
     if user["bio"]:
         embed.add_field(name="📝 Bio", value=user["bio"], inline=False)
@@ -4369,23 +5696,22 @@ async def meme(ctx):
 
     try:
         # Try the primary meme API
-        async with aiohttp.ClientSession() as session:
-            async with session.get("https://meme-api.com/gimme", timeout=8) as response:
-                if response.status == 200:
-                    data = await response.json()
-
-                    # Validate the response data
-                    if (isinstance(data, dict) and
-                        "url" in data and
-                        "title" in data and
-                        "subreddit" in data and
-                        data.get("nsfw", False) is False):  # Skip NSFW content
-
-                        # Verify it's actually an image URL
-                        image_extensions = (".jpg", ".jpeg", ".png", ".gif", ".webp")
-                        if data["url"].lower().endswith(image_extensions):
-
-                            description = f"""
+        async with bot.http_session.get("https://meme-api.com/gimme", timeout=8) as response:
+            if response.status == 200:
+                data = await response.json()
+
+                # Validate the response data
+                if (isinstance(data, dict) and
+                    "url" in data and
+                    "title" in data and
+                    "subreddit" in data and
+                    data.get("nsfw", False) is False):  # Skip NSFW content
+
+                    # Verify it's actually an image URL
+                    image_extensions = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+                    if data["url"].lower().endswith(image_extensions):
+
+                        description = f"""
 ╔══════════════════════════════════╗
 ║         😂 **FRESH MEME** 😂         ║
 ╠══════════════════════════════════╣
@@ -4396,41 +5722,40 @@ async def meme(ctx):
 ╚══════════════════════════════════╝
 """
 
-                            embed = create_aesthetic_embed("Meme Central", description, discord.Color.random())
-                            embed.set_image(url=data["url"])
-                            embed.add_field(name="📊 Reddit Stats",
-                                          value=f"👍 {data.get('ups', 'N/A'):,} upvotes",
-                                          inline=True)
-                            embed.add_field(name="🏷️ Category",
-                                          value=f"r/{data.get('subreddit', 'memes')}",
-                                          inline=True)
-                            embed.add_field(name="🎭 Humor Level",
-                                          value="**MAXIMUM** 😂",
-                                          inline=True)
-                            embed.add_field(name="🔗 Original Post",
-                                          value=f"[View on Reddit]({data.get('postLink', '#')})",
-                                          inline=False)
-
-                            return await ctx.send(embed=embed)
+                        embed = create_aesthetic_embed("Meme Central", description, discord.Color.random())
+                        embed.set_image(url=data["url"])
+                        embed.add_field(name="📊 Reddit Stats",
+                                      value=f"👍 {data.get('ups', 'N/A'):,} upvotes",
+                                      inline=True)
+                        embed.add_field(name="🏷️ Category",
+                                      value=f"r/{data.get('subreddit', 'memes')}",
+                                      inline=True)
+                        embed.add_field(name="🎭 Humor Level",
+                                      value="**MAXIMUM** 😂",
+                                      inline=True)
+                        embed.add_field(name="🔗 Original Post",
+                                      value=f"[View on Reddit]({data.get('postLink', '#')})",
+                                      inline=False)
+
+                        return await ctx.send(embed=embed)
 
         # If primary API fails, try alternative meme subreddit
         subreddits = ["memes", "dankmemes", "wholesomememes", "funny", "memeeconomy"]
         for subreddit in subreddits:
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(f"https://meme-api.com/gimme/{subreddit}", timeout=6) as response:
-                        if response.status == 200:
-                            data = await response.json()
+                async with bot.http_session.get(f"https://meme-api.com/gimme/{subreddit}", timeout=6) as response:
+                    if response.status == 200:
+                        data = await response.json()
 
-                            if (isinstance(data, dict) and
-                                "url" in data and
-                                "title" in data and
-                                data.get("nsfw", False) is False):
+                        if (isinstance(data, dict) and
+                            "url" in data and
+                            "title" in data and
+                            data.get("nsfw", False) is False):
 
-                                image_extensions = (".jpg", ".jpeg", ".png", ".gif", ".webp")
-                                if data["url"].lower().endswith(image_extensions):
+                            image_extensions = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+                            if data["url"].lower().endswith(image_extensions):
 
-                                    description = f"""
+                                description = f"""
 ╔══════════════════════════════════╗
 ║         🔥 **HOT MEME** 🔥         ║
 ╠══════════════════════════════════╣
@@ -4440,19 +5765,19 @@ async def meme(ctx):
 ╚══════════════════════════════════╝
 """
 
-                                    embed = create_aesthetic_embed("Meme Central", description, discord.Color.orange())
-                                    embed.set_image(url=data["url"])
-                                    embed.add_field(name="📊 Stats",
-                                                  value=f"👍 {data.get('ups', 0):,} upvotes",
-                                                  inline=True)
-                                    embed.add_field(name="🎯 Subreddit",
-                                                  value=f"r/{subreddit}",
-                                                  inline=True)
-                                    embed.add_field(name="⚡ Freshness",
-                                                  value="**JUST POSTED** 🆕",
-                                                  inline=True)
+                                embed = create_aesthetic_embed("Meme Central", description, discord.Color.orange())
+                                embed.set_image(url=data["url"])
+                                embed.add_field(name="📊 Stats",
+                                              value=f"👍 {data.get('ups', 0):,} upvotes",
+                                              inline=True)
+                                embed.add_field(name="🎯 Subreddit",
+                                              value=f"r/{subreddit}",
+                                              inline=True)
+                                embed.add_field(name="⚡ Freshness",
+                                              value="**JUST POSTED** 🆕",
+                                              inline=True)
 
-                                    return await ctx.send(embed=embed)
+                                return await ctx.send(embed=embed)
 
             except Exception as e:
                 print(f"Subreddit {subreddit} meme fetch failed: {e}")
@@ -4507,15 +5832,14 @@ async def meme(ctx):
 async def cat(ctx):
     """Get a random cat picture"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get("https://api.thecatapi.com/v1/images/search") as response:
-                if response.status == 200:
-                    data = await response.json()
-                    embed = discord.Embed(title="🐱 Random Cat", color=discord.Color.random())
-                    embed.set_image(url=data[0]["url"])
-                    await ctx.send(embed=embed)
-                else:
-                    await ctx.send("Failed to fetch a cat picture. Try again later.")
+        async with bot.http_session.get("https://api.thecatapi.com/v1/images/search") as response:
+            if response.status == 200:
+                data = await response.json()
+                embed = discord.Embed(title="🐱 Random Cat", color=discord.Color.random())
+                embed.set_image(url=data[0]["url"])
+                await ctx.send(embed=embed)
+            else:
+                await ctx.send("Failed to fetch a cat picture. Try again later.")
     except Exception as e:
         print(f"Cat command error: {e}")
         await ctx.send("Failed to fetch a cat picture. Try again later.")
@@ -4524,15 +5848,14 @@ async def cat(ctx):
 async def dog(ctx):
     """Get a random dog picture"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get("https://dog.ceo/api/breeds/image/random") as response:
-                if response.status == 200:
-                    data = await response.json()
-                    embed = discord.Embed(title="🐶 Random Dog", color=discord.Color.random())
-                    embed.set_image(url=data["message"])
-                    await ctx.send(embed=embed)
-                else:
-                    await ctx.send("Failed to fetch a dog picture. Try again later.")
+        async with bot.http_session.get("https://dog.ceo/api/breeds/image/random") as response:
+            if response.status == 200:
+                data = await response.json()
+                embed = discord.Embed(title="🐶 Random Dog", color=discord.Color.random())
+                embed.set_image(url=data["message"])
+                await ctx.send(embed=embed)
+            else:
+                await ctx.send("Failed to fetch a dog picture. Try again later.")
     except Exception as e:
         print(f"Dog command error: {e}")
         await ctx.send("Failed to fetch a dog picture. Try again later.")
@@ -4613,29 +5936,28 @@ async def gif(ctx, *, search_term):
 
     try:
         # Search for GIF using Tenor API
-        async with aiohttp.ClientSession() as session:
-            url = "https://tenor.googleapis.com/v2/search"
-            params = {
-                "q": search_term,
-                "key": TENOR_API_KEY,
-                "limit": 20,  # Get multiple options
-                "media_filter": "gif",
-                "contentfilter": "medium",  # Filter out inappropriate content
-                "random": "true"  # Get random results
-            }
-
-            async with session.get(url, params=params, timeout=10) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    results = data.get("results", [])
-
-                    if results:
-                        # Select a random GIF from results
-                        selected_gif = random.choice(results)
-                        gif_url = selected_gif.get("media_formats", {}).get("gif", {}).get("url")
-
-                        if gif_url:
-                            description = f"""
+        url = "https://tenor.googleapis.com/v2/search"
+        params = {
+            "q": search_term,
+            "key": TENOR_API_KEY,
+            "limit": 20,  # Get multiple options
+            "media_filter": "gif",
+            "contentfilter": "medium",  # Filter out inappropriate content
+            "random": "true"  # Get random results
+        }
+
+        async with bot.http_session.get(url, params=params, timeout=10) as response:
+            if response.status == 200:
+                data = await response.json()
+                results = data.get("results", [])
+
+                if results:
+                    # Select a random GIF from results
+                    selected_gif = random.choice(results)
+                    gif_url = selected_gif.get("media_formats", {}).get("gif", {}).get("url")
+
+                    if gif_url:
+                        description = f"""
 ╔══════════════════════════════════╗
 ║        🎬 **GIF SEARCH** 🎬        ║
 ╠══════════════════════════════════╣
@@ -4646,44 +5968,43 @@ async def gif(ctx, *, search_term):
 ╚══════════════════════════════════╝
 """
 
-                            embed = create_aesthetic_embed("Perfect Match!", description, discord.Color.random())
-                            embed.set_image(url=gif_url)
-                            embed.add_field(name="🎯 Search Quality", value="**HIGH** ✨", inline=True)
-                            embed.add_field(name="🔄 Randomized", value="**YES** 🎲", inline=True)
-                            embed.add_field(name="📱 Mobile Friendly", value="**OPTIMIZED** 📱", inline=True)
+                        embed = create_aesthetic_embed("Perfect Match!", description, discord.Color.random())
+                        embed.set_image(url=gif_url)
+                        embed.add_field(name="🎯 Search Quality", value="**HIGH** ✨", inline=True)
+                        embed.add_field(name="🔄 Randomized", value="**YES** 🎲", inline=True)
+                        embed.add_field(name="📱 Mobile Friendly", value="**OPTIMIZED** 📱", inline=True)
 
-                            # Add link to original if available
-                            if selected_gif.get("url"):
-                                embed.add_field(name="🔗 Original Post",
-                                              value=f"[Open in Tenor]({selected_gif['url']})",
-                                              inline=False)
+                        # Add link to original if available
+                        if selected_gif.get("url"):
+                            embed.add_field(name="🔗 Original Post",
+                                          value=f"[Open in Tenor]({selected_gif['url']})",
+                                          inline=False)
 
-                            return await ctx.send(embed=embed)
+                        return await ctx.send(embed=embed)
 
-                # If Tenor API fails, try alternative search
-                print(f"Tenor API returned status {response.status} for search: {search_term}")
+            # If Tenor API fails, try alternative search
+            print(f"Tenor API returned status {response.status} for search: {search_term}")
 
         # Try alternative Tenor endpoint
-        async with aiohttp.ClientSession() as session:
-            url = "https://tenor.googleapis.com/v2/featured"
-            params = {
-                "key": TENOR_API_KEY,
-                "limit": 10,
-                "media_filter": "gif",
-                "contentfilter": "medium"
-            }
-
-            async with session.get(url, params=params, timeout=8) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    results = data.get("results", [])
-
-                    if results:
-                        selected_gif = random.choice(results)
-                        gif_url = selected_gif.get("media_formats", {}).get("gif", {}).get("url")
-
-                        if gif_url:
-                            description = f"""
+        url = "https://tenor.googleapis.com/v2/featured"
+        params = {
+            "key": TENOR_API_KEY,
+            "limit": 10,
+            "media_filter": "gif",
+            "contentfilter": "medium"
+        }
+
+        async with bot.http_session.get(url, params=params, timeout=8) as response:
+            if response.status == 200:
+                data = await response.json()
+                results = data.get("results", [])
+
+                if results:
+                    selected_gif = random.choice(results)
+                    gif_url = selected_gif.get("media_formats", {}).get("gif", {}).get("url")
+
+                    if gif_url:
+                        description = f"""
 ╔══════════════════════════════════╗
 ║       🌟 **FEATURED GIF** 🌟       ║
 ╠══════════════════════════════════╣
@@ -4694,13 +6015,13 @@ async def gif(ctx, *, search_term):
 ╚══════════════════════════════════╝
 """
 
-                            embed = create_aesthetic_embed("Trending GIF", description, discord.Color.gold())
-                            embed.set_image(url=gif_url)
-                            embed.add_field(name="⭐ Status", value="**FEATURED** 🌟", inline=True)
-                            embed.add_field(name="🔥 Popularity", value="**TRENDING** 📈", inline=True)
-                            embed.add_field(name="✨ Quality", value="**PREMIUM** 💎", inline=True)
+                        embed = create_aesthetic_embed("Trending GIF", description, discord.Color.gold())
+                        embed.set_image(url=gif_url)
+                        embed.add_field(name="⭐ Status", value="**FEATURED** 🌟", inline=True)
+                        embed.add_field(name="🔥 Popularity", value="**TRENDING** 📈", inline=True)
+                        embed.add_field(name="✨ Quality", value="**PREMIUM** 💎", inline=True)
 
-                            return await ctx.send(embed=embed)
+                        return await ctx.send(embed=embed)
 
         # If all else fails, use curated GIF collection
         curated_gifs = [
@@ -4800,6 +6121,9 @@ async def botstats(ctx):
     embed.add_field(name="Servers", value=len(bot.guilds), inline=True)
     embed.add_field(name="Users", value=len(bot.users), inline=True)
     embed.add_field(name="Commands", value=len(bot.commands), inline=True)
+    embed.add_field(name="🧠 User Cache", value=f"{len(user_cache)} cached • {user_cache.hit_rate():.0%} hit rate", inline=True)
+    embed.add_field(name="🎞️ GIF Pools", value=gif_pools.stats(), inline=True)
+    embed.add_field(name="🗄️ Database Latency", value=format_db_latency(), inline=False)
     await ctx.send(embed=embed)
 
 @bot.command()